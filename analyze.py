@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import chess
+import chess.pgn
+import myengine
+
+IN_FLIGHT_PER_WORKER = 4  # Positions queued per worker, bounds memory on huge inputs
+REPORT_EVERY = 100
+
+# Yields (position_id, fen, extra) one position at a time; nothing is read ahead.
+# A line that can't be parsed comes out with fen None and the reason in extra['error']
+def iter_pgn_positions(path, every=1):
+    with open(path, encoding='utf-8', errors='replace') as f:
+        game_index = 0
+        while True:
+            game = chess.pgn.read_game(f)
+            if game is None:
+                break
+            board = game.board()
+            extra = {'white': game.headers.get('White'), 'black': game.headers.get('Black')}
+            for ply, move in enumerate(game.mainline_moves()):
+                if ply % every == 0:
+                    yield f"{game_index}:{ply}", board.fen(), extra
+                board.push(move)
+            game_index += 1
+
+def iter_epd_positions(path, every=1):
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line_no, line in enumerate(f):
+            line = line.strip()
+            if not line or line.startswith('#') or line_no % every:
+                continue
+            try:
+                board, ops = chess.Board.from_epd(line)
+                extra = {}
+                if 'bm' in ops:
+                    extra['bm'] = [board.san(move) for move in ops['bm']]
+            except ValueError as e:
+                yield str(line_no), None, {'error': f"bad EPD line {line_no + 1}: {e}"}
+                continue
+            yield str(ops.get('id', line_no)), board.fen(), extra
+
+def iter_positions(path, every=1):
+    if path.lower().endswith('.epd'):
+        return iter_epd_positions(path, every)
+    return iter_pgn_positions(path, every)
+
+# Ids already written by an earlier, interrupted run. A torn last line is cut off,
+# so resumed results start on a line of their own
+def load_checkpoint(output):
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        # Scan back from the end for the last newline, a block at a time
+        while pos > 0:
+            start = max(0, pos - 4096)
+            f.seek(start)
+            block = f.read(pos - start)
+            if pos == end and block.endswith(b'\n'):
+                break
+            cut = block.rfind(b'\n')
+            if cut >= 0:
+                f.truncate(start + cut + 1)
+                break
+            pos = start
+        else:
+            f.truncate(0)
+    with open(output, encoding='utf-8') as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)['id'])
+            except (ValueError, KeyError):
+                continue
+    return done
+
+# --- Worker process ---
+_engine = None
+_multipv = 1
+
+def init_worker(depth, multipv, model_path, options):
+    global _engine, _multipv
+    ml = None
+    if model_path:
+        import ml_model
+        ml = ml_model.load_model(model_path)
+    evaluator = myengine.Evaluator(use_ml=ml is not None, ml_model=ml)
+    _engine = myengine.MyEngine(evaluator, depth=depth, **options)
+    _multipv = multipv
+
+def analyse_position(position_id, fen, time_limit):
+    board = chess.Board(fen)
+    start = time.perf_counter()
+    lines = _engine.analyse(board, multipv=_multipv, time_limit=time_limit)
+    result = {
+        'id': position_id,
+        'fen': fen,
+        'nodes': _engine.nodes,
+        'time': round(time.perf_counter() - start, 3),
+        'depth': lines[0].depth if lines else 0,
+        'best_move': lines[0].move.uci() if lines else None,
+        'san': board.san(lines[0].move) if lines else None,
+        'score': round(lines[0].score, 3) if lines else None,
+        'mate': myengine.mate_in(lines[0].score) if lines else None,
+        'pv': [move.uci() for move in lines[0].pv] if lines else [],
+    }
+    if _multipv > 1:
+        result['lines'] = [
+            {'move': line.move.uci(), 'score': round(line.score, 3), 'pv': [m.uci() for m in line.pv]}
+            for line in lines
+        ]
+    return result
+
+# --- Driver ---
+def run(args):
+    done = load_checkpoint(args.output)
+    if done:
+        print(f"Resuming: {len(done)} positions already in {args.output}", file=sys.stderr)
+    options = dict(pvs=args.pvs, null_move=args.null_move, lmr=args.lmr, futility=args.futility)
+    workers = args.workers or os.cpu_count() or 1
+    max_in_flight = workers * IN_FLIGHT_PER_WORKER
+    analysed = 0
+    errors = 0
+    next_report = REPORT_EVERY
+    start = time.perf_counter()
+    with open(args.output, 'a', encoding='utf-8') as out, ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker,
+            initargs=(args.depth, args.multipv, args.model, options)) as pool:
+        in_flight = {}
+        positions = iter_positions(args.input, args.every)
+        try:
+            exhausted = False
+            while not exhausted or in_flight:
+                while not exhausted and len(in_flight) < max_in_flight:
+                    item = next(positions, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    position_id, fen, extra = item
+                    if position_id in done:
+                        continue
+                    if fen is None:
+                        # Written like a result, so a resumed run moves past the line
+                        out.write(json.dumps({'id': position_id, **extra}) + '\n')
+                        errors += 1
+                        continue
+                    future = pool.submit(analyse_position, position_id, fen, args.time)
+                    in_flight[future] = (position_id, fen, extra)
+                if not in_flight:
+                    break
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    position_id, fen, extra = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                        analysed += 1
+                    except BrokenProcessPool:
+                        raise  # A crashed worker, not this position's fault
+                    except Exception as e:
+                        result = {'id': position_id, 'fen': fen, 'error': f"{type(e).__name__}: {e}"}
+                        errors += 1
+                    result.update({k: v for k, v in extra.items() if v is not None})
+                    out.write(json.dumps(result) + '\n')
+                out.flush()
+                if analysed >= next_report:
+                    next_report += REPORT_EVERY
+                    rate = analysed / (time.perf_counter() - start)
+                    print(f"{analysed} positions analysed ({rate:.1f}/s)", file=sys.stderr)
+        except KeyboardInterrupt:
+            pool.shutdown(wait=False, cancel_futures=True)
+            out.flush()
+            print(f"Interrupted after {analysed} positions; rerun the same command to resume", file=sys.stderr)
+            return
+    print(f"Done: {analysed} positions analysed, {errors} errors, results in {args.output}", file=sys.stderr)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Analyse every position of a PGN or EPD file with MyEngine')
+    parser.add_argument('input', help='.pgn or .epd file')
+    parser.add_argument('-o', '--output', default='analysis.jsonl', help='JSONL results, also the resume checkpoint')
+    parser.add_argument('--depth', type=int, default=3, help='Maximum search depth per position')
+    parser.add_argument('--time', type=float, default=None, help='Time limit per position in seconds')
+    parser.add_argument('--multipv', type=int, default=1)
+    parser.add_argument('--every', type=int, default=1, help='Only analyse every Nth ply/line')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--model', default=None, help='Use ML evaluation with this model file')
+    parser.add_argument('--pvs', action='store_true')
+    parser.add_argument('--null-move', action='store_true')
+    parser.add_argument('--lmr', action='store_true')
+    parser.add_argument('--futility', action='store_true')
+    run(parser.parse_args())
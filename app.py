@@ -3,6 +3,7 @@ import chess
 import time
 import os
 import base64
+from engine_service import EngineService, EngineBusy
 
 ASSETS_PATH = os.path.join(os.path.dirname(__file__), 'assets')
 PIECE_TO_PNG = {
@@ -48,6 +49,11 @@ def get_base64(file_path):
     with open(file_path, "rb") as f:
         return base64.b64encode(f.read()).decode()
 
+# One engine service per server process, shared by all sessions
+@st.cache_resource
+def get_engine_service():
+    return EngineService(use_ml=os.path.exists(os.path.join(os.path.dirname(__file__), 'ml_model.pth')))
+
 # Streamlit app
 st.set_page_config(page_title="Chess", layout="centered")
 st.title("♟️ Streamlit Chess")
@@ -55,7 +61,12 @@ st.title("♟️ Streamlit Chess")
 # Sidebar settings
 st.sidebar.header("Settings")
 time_control = st.sidebar.selectbox("Time Control (minutes)", [5, 10, 15], index=0)
+ai_color = st.sidebar.selectbox("AI plays", ["None", "Black", "White"], index=1)
+ai_depth = st.sidebar.slider("AI Depth", 1, 4, 2)
+ai_time = st.sidebar.slider("AI Time per Move (s)", 0.5, 10.0, 2.0, 0.5)
 if st.sidebar.button("Reset Game"):
+    if st.session_state.get('ai_job'):
+        get_engine_service().cancel(st.session_state.ai_job[0])
     st.session_state.clear()
     st.rerun()
 
@@ -70,6 +81,7 @@ if 'board' not in st.session_state:
     st.session_state.turn = 0  # 0=white, 1=black
     st.session_state.game_over = False
     st.session_state.result = ''
+    st.session_state.ai_job = None  # (job_id, fen of the position it searches)
 
 # Clocks
 def update_clocks():
@@ -98,6 +110,36 @@ elif st.session_state.board.is_insufficient_material():
     st.session_state.game_over = True
     st.session_state.result = 'Draw by insufficient material!'
 
+# AI move: submit the position once, then poll on each rerun so the page stays responsive
+ai_turn = (ai_color == "White" and st.session_state.board.turn == chess.WHITE) or \
+          (ai_color == "Black" and st.session_state.board.turn == chess.BLACK)
+ai_thinking = False
+fen = st.session_state.board.fen()
+if st.session_state.ai_job is not None and (
+        not ai_turn or st.session_state.game_over or st.session_state.ai_job[1] != fen):
+    # The AI side or the position changed while it was thinking: that result is stale
+    get_engine_service().cancel(st.session_state.ai_job[0])
+    st.session_state.ai_job = None
+if ai_turn and not st.session_state.game_over:
+    service = get_engine_service()
+    if st.session_state.ai_job is None:
+        try:
+            st.session_state.ai_job = (service.submit(fen, depth=ai_depth, time_limit=ai_time), fen)
+        except EngineBusy:
+            pass
+    if st.session_state.ai_job is not None:
+        done, move_uci = service.poll(st.session_state.ai_job[0])
+        if done:
+            st.session_state.ai_job = None
+            if move_uci:
+                move = chess.Move.from_uci(move_uci)
+                st.session_state.move_history.append(st.session_state.board.san(move))
+                st.session_state.board.push(move)
+                st.session_state.turn = 1 - st.session_state.turn
+                st.session_state.last_time = time.time()
+                st.rerun()
+    ai_thinking = True
+
 # Clocks display
 col1, col2, col3 = st.columns([1,2,1])
 with col1:
@@ -112,7 +154,7 @@ with colb:
 
 # Move handling
 query_params = st.query_params
-if 'move' in query_params and not st.session_state.game_over:
+if 'move' in query_params and not st.session_state.game_over and not ai_turn:
     sq = int(query_params['move'][0])
     if st.session_state.selected is None:
         piece = st.session_state.board.piece_at(sq)
@@ -147,4 +189,10 @@ with colm:
         b = moves[i+1] if i+1 < len(moves) else ''
         st.write(f"{i//2+1}. {w} {b}")
     if st.session_state.game_over:
-        st.markdown(f"## {st.session_state.result}") 
\ No newline at end of file
+        st.markdown(f"## {st.session_state.result}")
+    elif ai_thinking:
+        st.markdown("*AI is thinking...*")
+
+if ai_thinking:
+    time.sleep(0.25)
+    st.rerun() 
\ No newline at end of file
@@ -0,0 +1,144 @@
+import collections
+import queue
+import threading
+import time
+
+import numpy as np
+import torch
+import ml_model
+import myengine
+
+DEFAULT_MAX_BATCH = 64
+DEFAULT_MAX_WAIT = 0.002  # Seconds to wait for a batch to fill after the first request
+RELOAD_INTERVAL = 1.0     # Seconds between checks for newly published weights
+
+# Collects leaf evaluations from many self-play workers and runs them through
+# one BoardMLP forward pass per batch. Requests are (client_id, request_id, planes)
+# on a shared queue; each client gets (request_id, score, model_version) back on
+# its own queue. With a watcher, new weights are swapped in between batches.
+class InferenceServer:
+    def __init__(self, model, request_queue, response_queues,
+                 max_batch=DEFAULT_MAX_BATCH, max_wait=DEFAULT_MAX_WAIT, watcher=None):
+        self.model = model
+        self.version = getattr(model, 'version', 0)
+        self.watcher = watcher
+        self.last_reload_check = time.monotonic()
+        self.reloads = 0
+        self.requests = request_queue
+        self.responses = response_queues
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        # Each client (one self-play game at a time) has at most one request in
+        # flight, so a batch can never grow past the number of clients still playing
+        self.active_clients = len(response_queues)
+        self.batch_sizes = collections.Counter()
+        self.positions = 0
+        self.inference_time = 0.0
+        self.started = None
+        self.stopped = None
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+        self.stopped = time.perf_counter()
+
+    def client_done(self):
+        self.active_clients -= 1
+
+    def run(self):
+        self.model.eval()
+        while self.running:
+            try:
+                batch = [self.requests.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            limit = min(self.max_batch, max(1, self.active_clients))
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.evaluate_batch(batch)
+            self.maybe_reload()
+
+    def maybe_reload(self):
+        if self.watcher is None or time.monotonic() - self.last_reload_check < RELOAD_INTERVAL:
+            return
+        self.last_reload_check = time.monotonic()
+        model = self.watcher.poll()
+        if model is not None:
+            self.model = model.eval()
+            self.version = model.version
+            self.reloads += 1
+
+    def evaluate_batch(self, batch):
+        start = time.perf_counter()
+        x = torch.from_numpy(np.stack([planes for _, _, planes in batch]).astype(np.float32))
+        with torch.no_grad():
+            scores = self.model(x).squeeze(1).tolist()
+        self.inference_time += time.perf_counter() - start
+        for (client_id, request_id, _), score in zip(batch, scores):
+            self.responses[client_id].put((request_id, score, self.version))
+        self.batch_sizes[len(batch)] += 1
+        self.positions += len(batch)
+
+    def stats(self):
+        end = self.stopped or time.perf_counter()
+        elapsed = end - self.started if self.started else 0.0
+        batches = sum(self.batch_sizes.values())
+        return {
+            'positions': self.positions,
+            'batches': batches,
+            'mean_batch': self.positions / batches if batches else 0.0,
+            'positions_per_sec': self.positions / elapsed if elapsed else 0.0,
+            'inference_time': self.inference_time,
+            'reloads': self.reloads,
+            'batch_sizes': dict(sorted(self.batch_sizes.items())),
+        }
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f"Inference: {stats['positions']} positions in {stats['batches']} batches, "
+              f"mean batch {stats['mean_batch']:.1f}, {stats['positions_per_sec']:.0f} positions/sec "
+              f"({stats['inference_time']:.2f}s in forward passes)")
+        for size, count in stats['batch_sizes'].items():
+            print(f"  batch {size:>3}: {count}")
+
+# Worker-side stand-in for a model: blocks its game's thread until the server answers
+class InferenceClient:
+    def __init__(self, client_id, request_queue, response_queue, version=0):
+        self.client_id = client_id
+        self.requests = request_queue
+        self.responses = response_queue
+        self.version = version
+        self.next_id = 0
+
+    def evaluate(self, board):
+        self.next_id += 1
+        planes = ml_model.board_to_array(board, dtype=np.uint8)
+        self.requests.put((self.client_id, self.next_id, planes))
+        request_id, score, version = self.responses.get()
+        assert request_id == self.next_id
+        # Evaluator.version follows the server, so cache entries of old weights stop matching
+        self.version = version
+        return score
+
+class BatchedEvaluator(myengine.Evaluator):
+    def __init__(self, client: InferenceClient, cache=None):
+        super().__init__(use_ml=True, ml_model=client, cache=cache)
+
+    def evaluate_uncached(self, board):
+        return self.ml_model.evaluate(board)
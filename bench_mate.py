@@ -0,0 +1,67 @@
+import argparse
+import time
+
+import chess
+import mate_search
+import myengine
+
+PUZZLES_PATH = 'mate_puzzles.epd'
+
+def load_puzzles(path):
+    puzzles = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            board, ops = chess.Board.from_epd(line)
+            puzzles.append((ops.get('id', str(len(puzzles))), board, ops['dm']))
+    return puzzles
+
+def solve_pns(board, max_nodes):
+    solver = mate_search.MateSolver(max_nodes=max_nodes)
+    start = time.perf_counter()
+    result = solver.solve(board)
+    return result.mate, result.nodes, time.perf_counter() - start
+
+# Plain alpha-beta, one depth after another until it reports the mate; deeper than
+# max_depth is given up
+def solve_minimax(board, mate, max_depth):
+    nodes = 0
+    start = time.perf_counter()
+    for depth in range(1, min(2 * mate - 1, max_depth) + 1):
+        engine = myengine.MyEngine(myengine.Evaluator(params_path=None), depth=depth)
+        engine.choose_move(board)
+        nodes += engine.nodes
+        found = myengine.mate_in(engine.best_score)
+        if found is not None and found > 0:
+            return found, nodes, time.perf_counter() - start
+    return None, nodes, time.perf_counter() - start
+
+def fmt(mate, nodes, elapsed):
+    if mate is None:
+        return f"{'-':>6}{nodes:>10}{elapsed:>9.2f}"
+    return f"{'#' + str(mate):>6}{nodes:>10}{elapsed:>9.2f}"
+
+def run(path, max_nodes, max_depth):
+    puzzles = load_puzzles(path)
+    print(f"{'puzzle':<18}{'dm':>3}  {'pns':>6}{'nodes':>10}{'time':>9}  {'minimax':>6}{'nodes':>10}{'time':>9}")
+    totals = {'pns': [0, 0.0], 'minimax': [0, 0.0]}
+    for name, board, mate in puzzles:
+        pns = solve_pns(board, max_nodes)
+        minimax = solve_minimax(board, mate, max_depth)
+        for key, (found, _, elapsed) in (('pns', pns), ('minimax', minimax)):
+            if found is not None:
+                totals[key][0] += 1
+                totals[key][1] += elapsed
+        print(f"{name:<18}{mate:>3}  {fmt(*pns)}  {fmt(*minimax)}")
+    for key, (solved, elapsed) in totals.items():
+        print(f"{key}: {solved}/{len(puzzles)} mates found, {elapsed:.2f}s in total on those")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time-to-mate of the proof-number mate solver against plain minimax')
+    parser.add_argument('--puzzles', default=PUZZLES_PATH, help='EPD file with dm (mate in N) operations')
+    parser.add_argument('--max-nodes', type=int, default=mate_search.DEFAULT_MAX_NODES)
+    parser.add_argument('--max-depth', type=int, default=5, help='Deepest minimax search to try')
+    args = parser.parse_args()
+    run(args.puzzles, args.max_nodes, args.max_depth)
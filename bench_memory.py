@@ -0,0 +1,73 @@
+import argparse
+import gc
+import random
+import resource
+import time
+import tracemalloc
+
+import chess
+import myengine
+import selfplay
+from bench_search import POSITIONS
+
+# Peak RSS, garbage-collector time and allocations of a fixed-depth search over the
+# bench_search positions, plus the memory self-play keeps per game. Run it before and
+# after a change to the engine internals; each run should be a fresh process, since
+# peak RSS never goes down.
+
+class GCTimer:
+    def __init__(self):
+        self.time = 0.0
+        self.collections = [0, 0, 0]
+        self.started = None
+
+    def __call__(self, phase, info):
+        if phase == 'start':
+            self.started = time.perf_counter()
+        else:
+            self.time += time.perf_counter() - self.started
+            self.collections[info['generation']] += 1
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux reports KiB
+
+def search_all(depth):
+    nodes = 0
+    for fen in POSITIONS:
+        engine = myengine.MyEngine(myengine.Evaluator(params_path=None), depth=depth)
+        engine.choose_move(chess.Board(fen))
+        nodes += engine.nodes
+    return nodes
+
+def run(depth, trace):
+    rss_before = peak_rss_mb()
+    timer = GCTimer()
+    gc.callbacks.append(timer)
+    start = time.perf_counter()
+    nodes = search_all(depth)
+    elapsed = time.perf_counter() - start
+    gc.callbacks.remove(timer)
+    print(f"Depth-{depth} search: {nodes} nodes in {elapsed:.2f}s")
+    print(f"  peak RSS     {peak_rss_mb():.1f} MB (+{peak_rss_mb() - rss_before:.1f} MB during the search)")
+    print(f"  GC time      {timer.time * 1000:.1f} ms in {sum(timer.collections)} collections "
+          f"(gen0/1/2: {'/'.join(map(str, timer.collections))})")
+    if trace:
+        # Much slower under tracemalloc, so only on request
+        tracemalloc.start()
+        search_all(depth)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  traced peak  {peak / 1024:.0f} KiB")
+    tracemalloc.start()
+    positions, _ = selfplay.play_game(myengine.Evaluator(params_path=None), adjudication=None, rng=random.Random(0))
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"Self-play game: {len(positions)} positions keep {retained / 1024:.0f} KiB "
+          f"({retained / max(1, len(positions)):.0f} bytes each)")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Memory and GC profile of a fixed-depth search')
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--trace', action='store_true', help='Also report the tracemalloc peak of the search')
+    args = parser.parse_args()
+    run(args.depth, args.trace)
@@ -0,0 +1,63 @@
+import argparse
+import time
+
+import chess
+import myengine
+
+# Opening, middlegame and endgame test positions
+POSITIONS = [
+    chess.STARTING_FEN,
+    'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3',
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    'r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP3PPP/R2QKB1R w KQ - 0 8',
+    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+    '6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1',
+]
+
+CONFIGS = [
+    ('alpha-beta', {}),
+    ('pvs', dict(pvs=True)),
+    ('null-move', dict(null_move=True)),
+    ('lmr', dict(lmr=True)),
+    ('futility', dict(futility=True)),
+    ('all', dict(pvs=True, null_move=True, lmr=True, futility=True)),
+]
+
+# Score of the position after `move` according to a full-width search (side to move's view)
+def reference_score(board, move, depth):
+    engine = myengine.MyEngine(myengine.Evaluator(), depth=depth)
+    board.push(move)
+    engine.prepare(board)
+    score = -engine.search(board, depth - 1, -myengine.INFINITE_SCORE, myengine.INFINITE_SCORE, 1, engine.root_key)
+    board.pop()
+    return score
+
+def run(depth):
+    print(f"{'config':<12}{'nodes':>10}{'time (s)':>10}{'same move':>11}{'score loss':>12}")
+    baseline = {}
+    for name, options in CONFIGS:
+        nodes = 0
+        elapsed = 0.0
+        same = 0
+        loss = 0.0
+        for fen in POSITIONS:
+            board = chess.Board(fen)
+            engine = myengine.MyEngine(myengine.Evaluator(), depth=depth, **options)
+            start = time.perf_counter()
+            move = engine.choose_move(board)
+            elapsed += time.perf_counter() - start
+            nodes += engine.nodes
+            if name == 'alpha-beta':
+                baseline[fen] = (move, engine.best_score)
+            best_move, best_score = baseline[fen]
+            if move == best_move:
+                same += 1
+            else:
+                loss += best_score - reference_score(board, move, depth)
+        print(f"{name:<12}{nodes:>10}{elapsed:>10.2f}{same:>7}/{len(POSITIONS):<3}{loss / len(POSITIONS):>12.3f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare selective search techniques against plain alpha-beta')
+    parser.add_argument('--depth', type=int, default=4)
+    args = parser.parse_args()
+    run(args.depth)
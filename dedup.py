@@ -0,0 +1,155 @@
+import argparse
+import glob
+import hashlib
+import os
+import sqlite3
+import time
+
+import numpy as np
+import zobrist
+
+INDEX_PATH = 'dedup_index.sqlite'
+OUT_SHARD_SIZE = 100_000  # Positions per deduplicated output shard
+NUM_PLANES = 12 * 64
+
+# Zobrist key of each (plane, index) of ml_model.board_to_array: planes 0-5 are White
+# P..K, 6-11 Black, and index 0 is a8, so the square is index ^ 56. XOR-ing the keys of
+# the set entries gives the piece-placement part of the polyglot key, which is all the
+# planes encode (positions differing only in side to move or castling rights have the
+# same training input, so merging them is what we want anyway)
+PLANE_KEYS = np.array([
+    zobrist.piece_key(plane % 6 + 1, plane < 6, index ^ 56)
+    for plane in range(12) for index in range(64)
+], dtype=np.uint64)
+
+def position_keys(X):
+    # (N, 768) planes -> (N,) int64 keys (signed, as SQLite stores them). Only the set
+    # entries (at most 32 per row) are gathered, not an (N, 768) array of keys
+    rows, planes = np.nonzero(X)
+    keys = np.zeros(len(X), dtype=np.uint64)
+    np.bitwise_xor.at(keys, rows, PLANE_KEYS[planes])
+    return keys.view(np.int64)
+
+def file_digest(path):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def iter_shards(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            yield from sorted(glob.glob(os.path.join(path, '*.npz')))
+        else:
+            yield path
+
+# On-disk index: one row per distinct position with its visit count, the sum of its
+# result labels and the planes bit-packed to 96 bytes. Only one shard is held in
+# memory at a time, so any number of shards can be merged. Shards already merged are
+# remembered by content hash, so rerunning on a growing shard directory only adds the
+# new ones, and a file regenerated under the same name counts as new.
+class DedupIndex:
+    def __init__(self, path=INDEX_PATH):
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS positions ('
+            'key INTEGER PRIMARY KEY, visits INTEGER NOT NULL, total REAL NOT NULL, planes BLOB NOT NULL)'
+        )
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS shards ('
+            'digest TEXT PRIMARY KEY, name TEXT NOT NULL, positions INTEGER NOT NULL)'
+        )
+        self.db.commit()
+
+    def has_shard(self, digest):
+        return self.db.execute('SELECT 1 FROM shards WHERE digest = ?', (digest,)).fetchone() is not None
+
+    def add_shard(self, path, digest=None):
+        digest = digest or file_digest(path)
+        with np.load(path) as data:
+            X = data['X']
+            y = data['y'].reshape(-1).astype(np.float64)
+        keys = position_keys(X)
+        # Merge duplicates inside the shard first (the start position is in every game)
+        unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        visits = np.bincount(inverse, minlength=len(unique))
+        totals = np.bincount(inverse, weights=y, minlength=len(unique))
+        packed = np.packbits(X[first] > 0, axis=1)
+        self.db.executemany(
+            'INSERT INTO positions (key, visits, total, planes) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET visits = visits + excluded.visits, total = total + excluded.total',
+            zip(unique.tolist(), visits.tolist(), totals.tolist(), map(bytes, packed)),
+        )
+        self.db.execute('INSERT INTO shards (digest, name, positions) VALUES (?, ?, ?)',
+                        (digest, os.path.basename(path), len(X)))
+        self.db.commit()
+        return len(X), len(unique)
+
+    def stats(self):
+        shards, positions = self.db.execute('SELECT COUNT(*), COALESCE(SUM(positions), 0) FROM shards').fetchone()
+        unique = self.db.execute('SELECT COUNT(*) FROM positions').fetchone()[0]
+        return {
+            'shards': shards,
+            'positions': positions,
+            'unique': unique,
+            'dedup_ratio': positions / unique if unique else 0.0,
+        }
+
+    def iter_batches(self, size=OUT_SHARD_SIZE):
+        # (X, y, visits) chunks; y is the mean result of all visits to the position
+        cursor = self.db.execute('SELECT visits, total, planes FROM positions ORDER BY key')
+        while True:
+            rows = cursor.fetchmany(size)
+            if not rows:
+                break
+            visits = np.array([row[0] for row in rows], dtype=np.int64)
+            totals = np.array([row[1] for row in rows], dtype=np.float64)
+            packed = np.frombuffer(b''.join(row[2] for row in rows), dtype=np.uint8).reshape(len(rows), -1)
+            X = np.unpackbits(packed, axis=1, count=NUM_PLANES).astype(np.float32)
+            y = (totals / visits).astype(np.float32).reshape(-1, 1)
+            yield X, y, visits
+
+    def close(self):
+        self.db.close()
+
+def write_shards(index, out_dir, size=OUT_SHARD_SIZE):
+    # The output replaces any earlier export, written under temporary names first
+    os.makedirs(out_dir, exist_ok=True)
+    for old in glob.glob(os.path.join(out_dir, 'dedup-*.npz')):
+        os.remove(old)
+    written = 0
+    for i, (X, y, visits) in enumerate(index.iter_batches(size)):
+        path = os.path.join(out_dir, f'dedup-{i:05d}.npz')
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, X=X, y=y, visits=visits)
+        os.replace(path + '.tmp', path)
+        written += len(X)
+    return written
+
+def run(args):
+    index = DedupIndex(args.index)
+    start = time.perf_counter()
+    for path in iter_shards(args.shards):
+        digest = file_digest(path)
+        if index.has_shard(digest):
+            print(f"{path}: already indexed, skipped")
+            continue
+        positions, unique = index.add_shard(path, digest)
+        print(f"{path}: {positions} positions, {unique} distinct")
+    stats = index.stats()
+    print(f"Indexed {stats['shards']} shards in {time.perf_counter() - start:.1f}s: "
+          f"{stats['positions']} positions -> {stats['unique']} unique "
+          f"(dedup ratio {stats['dedup_ratio']:.2f}x)")
+    if args.out:
+        written = write_shards(index, args.out, args.shard_size)
+        print(f"Wrote {written} positions to {args.out}/")
+    index.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Merge duplicate self-play positions across shards')
+    parser.add_argument('shards', nargs='+', help='Self-play .npz files and/or shard directories')
+    parser.add_argument('-o', '--out', default=None, help='Directory for the deduplicated shards')
+    parser.add_argument('--index', default=INDEX_PATH, help='On-disk position index, kept between runs')
+    parser.add_argument('--shard-size', type=int, default=OUT_SHARD_SIZE)
+    run(parser.parse_args())
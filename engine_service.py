@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import chess
+import ml_model
+import myengine
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(__file__), 'ml_model.pth')
+JOB_TTL = 300.0  # Seconds a finished job waits to be polled before it is dropped
+DEFAULT_WORKERS = 2  # Searches running at once; see EngineService.__init__
+
+# Raised by submit() when the service already has max_pending searches queued or running
+class EngineBusy(Exception):
+    pass
+
+# Process-wide engine: one loaded evaluator/ML model shared by every session,
+# searches run on a bounded worker pool and are polled by job id
+class EngineService:
+    def __init__(self, use_ml=False, model_path=DEFAULT_MODEL_PATH, max_workers=None,
+                 max_pending=None, default_time_limit=2.0, max_time_limit=10.0):
+        # Newly published weights are picked up by every new search, see submit()
+        self.watcher = ml_model.ModelWatcher(model_path) if use_ml and model_path else None
+        ml = self.watcher.poll() if self.watcher else None
+        self.evaluator = myengine.Evaluator(use_ml=use_ml, ml_model=ml)
+        # The search is pure Python, so the GIL makes every worker thread share one
+        # core: N searches running at once each get 1/N of it within their wall-clock
+        # time limit and reach a shallower depth. More than one worker only keeps a
+        # long search from holding up the others; further jobs wait in the queue
+        self.max_workers = max_workers or DEFAULT_WORKERS
+        self.max_pending = max_pending or self.max_workers * 8
+        self.default_time_limit = default_time_limit
+        self.max_time_limit = max_time_limit
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='engine')
+        self.jobs = {}  # job_id -> (future, engine)
+        self.finished = {}  # job_id -> time.monotonic() when its search ended
+        self.lock = threading.Lock()
+
+    def submit(self, fen, depth=2, time_limit=None):
+        if time_limit is None:
+            time_limit = self.default_time_limit
+        time_limit = min(time_limit, self.max_time_limit)
+        board = chess.Board(fen)
+        with self.lock:
+            self.reap()
+            # Finished jobs don't count: sessions that closed mid-search never poll theirs
+            active = sum(not future.done() for future, _ in self.jobs.values())
+            if active >= self.max_pending:
+                raise EngineBusy(f'{active} searches pending')
+            # Each job gets its own engine, so stop() only affects that search, and its own
+            # evaluator snapshot, so swapping in new weights never touches a running search
+            if self.watcher:
+                self.evaluator.refresh_model(self.watcher)
+            engine = myengine.MyEngine(self.evaluator.snapshot(), depth=depth, time_limit=time_limit)
+            job_id = uuid.uuid4().hex
+            future = self.pool.submit(engine.choose_move, board)
+            self.jobs[job_id] = (future, engine)
+        future.add_done_callback(lambda _: self.job_finished(job_id))
+        return job_id
+
+    def job_finished(self, job_id):
+        with self.lock:
+            if job_id in self.jobs:
+                self.finished[job_id] = time.monotonic()
+
+    def reap(self):
+        # Drop results nobody collected within JOB_TTL; called with the lock held
+        cutoff = time.monotonic() - JOB_TTL
+        for job_id, finished_at in list(self.finished.items()):
+            if finished_at < cutoff:
+                del self.finished[job_id]
+                self.jobs.pop(job_id, None)
+
+    def poll(self, job_id):
+        # Returns (done, move_uci); finished jobs are forgotten once collected
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return True, None
+            future, _ = job
+            if not future.done():
+                return False, None
+            del self.jobs[job_id]
+            self.finished.pop(job_id, None)
+        move = future.result()
+        return True, move.uci() if move else None
+
+    def cancel(self, job_id):
+        with self.lock:
+            job = self.jobs.pop(job_id, None)
+            self.finished.pop(job_id, None)
+        if job is not None:
+            future, engine = job
+            if not future.cancel():
+                engine.stop()
+
+    def pending(self):
+        # Searches queued or running
+        with self.lock:
+            return sum(not future.done() for future, _ in self.jobs.values())
+
+    def shutdown(self):
+        with self.lock:
+            jobs = list(self.jobs.values())
+            self.jobs.clear()
+            self.finished.clear()
+        for future, engine in jobs:
+            future.cancel()
+            engine.stop()
+        self.pool.shutdown(wait=False)
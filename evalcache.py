@@ -0,0 +1,160 @@
+import collections
+import sqlite3
+import threading
+
+import chess
+import chess.polyglot
+
+DEFAULT_MAX_ENTRIES = 1_000_000
+FLUSH_EVERY = 10_000  # Buffered disk writes before an automatic flush
+
+def position_key(board: chess.Board):
+    return chess.polyglot.zobrist_hash(board)
+
+# SQLite integers are signed 64-bit, Zobrist keys are unsigned
+def _to_db_key(key):
+    return key - (1 << 64) if key >= (1 << 63) else key
+
+# Bounded LRU cache of evaluator scores keyed by (Zobrist hash, evaluator version),
+# optionally backed by an SQLite file that survives restarts
+class EvalCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.entries = collections.OrderedDict()
+        self.pending = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS evals ('
+                'key INTEGER NOT NULL, version TEXT NOT NULL, score REAL NOT NULL, '
+                'PRIMARY KEY (key, version))'
+            )
+            self.db.commit()
+
+    def get(self, key, version):
+        entry = (key, version)
+        with self.lock:
+            score = self.entries.get(entry)
+            if score is not None:
+                self.entries.move_to_end(entry)
+                self.hits += 1
+                return score
+            if self.db is not None:
+                # Evicted from memory but not yet written out
+                score = self.pending.get(entry)
+                if score is not None:
+                    self._insert(entry, score)
+                    self.hits += 1
+                    return score
+                row = self.db.execute(
+                    'SELECT score FROM evals WHERE key = ? AND version = ?',
+                    (_to_db_key(key), version),
+                ).fetchone()
+                if row is not None:
+                    self._insert(entry, row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, version, score):
+        entry = (key, version)
+        with self.lock:
+            self._insert(entry, score)
+            if self.db is not None:
+                self.pending[entry] = score
+                if len(self.pending) >= FLUSH_EVERY:
+                    self._flush()
+
+    def _insert(self, entry, score):
+        self.entries[entry] = score
+        self.entries.move_to_end(entry)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if self.db is None or not self.pending:
+            return
+        self.db.executemany(
+            'INSERT OR REPLACE INTO evals (key, version, score) VALUES (?, ?, ?)',
+            [(_to_db_key(k), v, s) for (k, v), s in self.pending.items()],
+        )
+        self.db.commit()
+        self.pending.clear()
+
+    def warm(self, version=None, limit=None):
+        # Preload stored scores (most recently written first) into memory
+        if self.db is None:
+            return 0
+        limit = min(limit or self.max_entries, self.max_entries)
+        query = 'SELECT key, version, score FROM evals'
+        args = []
+        if version is not None:
+            query += ' WHERE version = ?'
+            args.append(version)
+        query += ' ORDER BY rowid DESC LIMIT ?'
+        args.append(limit)
+        with self.lock:
+            rows = self.db.execute(query, args).fetchall()
+            # Insert oldest first so the newest rows end up most recently used
+            for key, ver, score in reversed(rows):
+                self._insert((key % (1 << 64), ver), score)
+        return len(rows)
+
+    def invalidate(self, version=None):
+        # Drop every entry of one evaluator version (all entries if None)
+        with self.lock:
+            if version is None:
+                self.entries.clear()
+                self.pending.clear()
+            else:
+                for entry in [e for e in self.entries if e[1] == version]:
+                    del self.entries[entry]
+                for entry in [e for e in self.pending if e[1] == version]:
+                    del self.pending[entry]
+            if self.db is not None:
+                if version is None:
+                    self.db.execute('DELETE FROM evals')
+                else:
+                    self.db.execute('DELETE FROM evals WHERE version = ?', (version,))
+                self.db.commit()
+
+    def retain(self, version, prefix):
+        # Drop every entry whose version starts with prefix except `version`, including
+        # rows left in the database by models that were replaced in an earlier run
+        with self.lock:
+            for store in (self.entries, self.pending):
+                for entry in [e for e in store if e[1].startswith(prefix) and e[1] != version]:
+                    del store[entry]
+            if self.db is not None:
+                self.db.execute('DELETE FROM evals WHERE substr(version, 1, ?) = ? AND version != ?',
+                                (len(prefix), prefix, version))
+                self.db.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size': len(self.entries),
+        }
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            if self.db is not None:
+                self.db.close()
+                self.db = None
@@ -2,9 +2,13 @@ import pygame
 import sys
 import os
 import time
+import math
+import threading
 from board import ChessBoard
 import chess
 import myengine
+import ml_model
+from evalcache import EvalCache
 
 # --- Config ---
 ASSETS_PATH = os.path.join(os.path.dirname(__file__), 'assets')
@@ -28,6 +32,10 @@ BOARD_COLORS = [
     ((255, 255, 255), (0, 0, 0)),       # Classic
 ]
 TIME_CONTROLS = [300, 600, 900]  # 5, 10, 15 minutes
+ANALYSIS_DEPTH = 4
+ANALYSIS_LINES = 3
+MODEL_PATH = os.path.join(os.path.dirname(__file__), 'ml_model.pth')
+EVAL_CACHE_PATH = os.path.join(os.path.dirname(__file__), 'eval_cache.sqlite')
 
 # --- Main GUI Class ---
 class ChessGUI:
@@ -57,12 +65,20 @@ class ChessGUI:
         self.active_color = 0  # 0=white, 1=black
         self.ai_depth = 2
         self.ai_eval_type = 'classic'  # or 'ml'
-        self.evaluator = myengine.Evaluator(use_ml=False)
+        self.eval_cache = EvalCache(path=EVAL_CACHE_PATH)
+        self.evaluator = myengine.Evaluator(use_ml=False, cache=self.eval_cache)
+        self.model_watcher = ml_model.ModelWatcher(MODEL_PATH)
+        self.evaluator.refresh_model(self.model_watcher)
+        self.eval_cache.warm(version=self.evaluator.version)
         self.engine = myengine.MyEngine(self.evaluator, depth=self.ai_depth)
         self.human_color = 0  # 0=white, 1=black (for now, only white)
         self.load_images()
         self.sidebar_scroll = 0
         self.sidebar_max_scroll = 0
+        self.show_analysis = False
+        self.analysis_engine = None
+        self.analysis_fen = None
+        self.analysis_lines = []
 
     def load_images(self):
         for piece, filename in PIECE_TO_PNG.items():
@@ -303,6 +319,9 @@ class ChessGUI:
         self.screen.blit(w_label, (sidebar_left + padding, y + 10))
         self.screen.blit(b_label, (sidebar_left + padding, y + 10 + w_label.get_height() + 8))
         y += 10 + w_label.get_height() + 8 + b_label.get_height() + 18
+        # Engine lines
+        if self.show_analysis:
+            y = self.draw_analysis(sidebar_left, y, sq_size, sidebar_width)
         # Move List Title
         title_font = pygame.font.SysFont(None, int(sq_size*0.6))
         title = title_font.render("Move List", True, (255, 255, 255))
@@ -338,6 +357,7 @@ class ChessGUI:
             (f'T - Change Time Control: {TIME_CONTROLS[self.time_control_idx]//60} min', None),
             (f'D - AI Difficulty: {self.ai_depth}', None),
             (f'E - Evaluation: {self.ai_eval_type.upper()}', None),
+            (f'A - Toggle Analysis: {"ON" if self.show_analysis else "OFF"}', None),
             (f'M - Toggle Move Highlight: {"ON" if self.show_move_highlight else "OFF"}', None),
             (f'L - Toggle Last Move Highlight: {"ON" if self.show_last_move_highlight else "OFF"}', None),
             (f'O - Toggle Coordinates: {"ON" if self.show_coordinates else "OFF"}', None),
@@ -349,9 +369,63 @@ class ChessGUI:
             self.screen.blit(opt, (sidebar_left + padding, y))
             y += int(sq_size*0.7)
 
+    def start_analysis(self):
+        # Analyse a copy of the position on a background thread; results arrive after each depth
+        self.stop_analysis()
+        board = self.board.board.copy()
+        # Own evaluator, so refresh_model() before an AI move can't swap weights mid-analysis
+        engine = myengine.MyEngine(self.evaluator.snapshot(), depth=ANALYSIS_DEPTH, pvs=True)
+        self.analysis_engine = engine
+        self.analysis_fen = board.fen()
+        self.analysis_lines = []
+        def publish(lines):
+            if self.analysis_engine is engine:
+                self.analysis_lines = [(line, board.variation_san(line.pv)) for line in lines]
+        threading.Thread(target=engine.analyse, args=(board,),
+                         kwargs=dict(multipv=ANALYSIS_LINES, callback=publish), daemon=True).start()
+
+    def stop_analysis(self):
+        if self.analysis_engine:
+            self.analysis_engine.stop()
+        self.analysis_engine = None
+        self.analysis_fen = None
+        self.analysis_lines = []
+
+    def draw_eval_bar(self, board_left, board_top, board_size):
+        if not self.show_analysis:
+            return
+        score = self.analysis_lines[0][0].score if self.analysis_lines else 0.0
+        white_share = 0.5 + 0.5 * math.tanh(score / 4)
+        bar = pygame.Rect(board_left - 30, board_top, 16, board_size)
+        pygame.draw.rect(self.screen, (40, 40, 40), bar)
+        white_height = int(board_size * white_share)
+        pygame.draw.rect(self.screen, (235, 235, 235), (bar.x, bar.bottom - white_height, bar.width, white_height))
+
+    def draw_analysis(self, sidebar_left, y, sq_size, sidebar_width):
+        padding = 18
+        title_font = pygame.font.SysFont(None, int(sq_size*0.6))
+        depth = self.analysis_lines[0][0].depth if self.analysis_lines else 0
+        title = title_font.render(f"Analysis (depth {depth})", True, (255, 255, 255))
+        self.screen.blit(title, (sidebar_left + padding, y))
+        y += 38
+        font = pygame.font.SysFont(None, int(sq_size*0.4))
+        max_width = sidebar_width - 2*padding
+        for line, san in self.analysis_lines:
+            mate = myengine.mate_in(line.score)
+            score = f"#{mate}" if mate is not None else f"{line.score:+.2f}"
+            text = f"{score}  {san}"
+            while font.size(text)[0] > max_width and len(text) > 4:
+                text = text[:-4] + '...'
+            label = font.render(text, True, (220, 220, 220))
+            self.screen.blit(label, (sidebar_left + padding, y))
+            y += int(sq_size*0.38) + 6
+        return y + 18
+
     def ai_move(self):
         # Only play if not game over and it's AI's turn
         if not self.game_over and self.board.board.turn == (self.human_color == 1):
+            # Pick up weights published by the training loop since the last move
+            self.evaluator.refresh_model(self.model_watcher)
             move = self.engine.choose_move(self.board.board)
             if move:
                 san = self.board.board.san(move)
@@ -373,6 +447,8 @@ class ChessGUI:
             # If it's AI's turn, make the AI move
             if not self.settings_open and not self.game_over and self.board.board.turn == (self.human_color == 1):
                 self.ai_move()
+            if self.show_analysis and self.board.fen() != self.analysis_fen:
+                self.start_analysis()
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     self.running = False
@@ -412,6 +488,10 @@ class ChessGUI:
                         elif event.key == pygame.K_e:
                             self.ai_eval_type = 'ml' if self.ai_eval_type == 'classic' else 'classic'
                             self.evaluator.use_ml = (self.ai_eval_type == 'ml')
+                        elif event.key == pygame.K_a:
+                            self.show_analysis = not self.show_analysis
+                            if not self.show_analysis:
+                                self.stop_analysis()
                         elif event.key == pygame.K_m:
                             self.show_move_highlight = not self.show_move_highlight
                         elif event.key == pygame.K_l:
@@ -461,6 +541,7 @@ class ChessGUI:
             self.draw_board(board_left, board_top, sq_size)
             self.draw_pieces(board_left, board_top, sq_size)
             self.draw_highlights(board_left, board_top, sq_size)
+            self.draw_eval_bar(board_left, board_top, board_size)
             # Draw sidebar (clocks, move list)
             if not self.settings_open:
                 self.draw_sidebar(sidebar_left, board_top, sq_size, sidebar_width, sidebar_height)
@@ -470,6 +551,8 @@ class ChessGUI:
                 self.draw_game_over(w, h)
             pygame.display.flip()
             self.clock.tick(60)
+        self.stop_analysis()
+        self.eval_cache.close()
         pygame.quit()
         sys.exit()
 
@@ -0,0 +1,163 @@
+import collections
+
+import chess
+import zobrist
+
+INFINITY = 10 ** 9        # Proof/disproof number of a solved node
+DEFAULT_MAX_NODES = 200_000
+STOP_CHECK_INTERVAL = 64  # Expansions between calls to should_stop
+
+# Result of a solve: mate is in moves for the attacker (None if not proven), pv is the
+# proof tree's main line (the defender picking its longest resistance)
+MateResult = collections.namedtuple('MateResult', ['move', 'mate', 'pv', 'nodes'])
+
+class Node:
+    __slots__ = ('key', 'move', 'attacker', 'pn', 'dn', 'children')
+
+    def __init__(self, key, move, attacker):
+        self.key = key
+        self.move = move
+        self.attacker = attacker  # True when the attacker is to move (an OR node)
+        self.pn = 1
+        self.dn = 1
+        self.children = None
+
+# Proof-number search for a forced mate by the side to move. The attacker only plays
+# checks and the defender tries every evasion, so the tree stays narrow; the most
+# proving leaf is expanded first, so short forced lines are found without searching
+# full width. Every solved position goes into `proofs` (Zobrist key -> (plies to mate,
+# mating move)), which is the proof tree once the root is proven and also lets
+# transpositions reuse earlier proofs.
+class MateSolver:
+    def __init__(self, max_nodes=DEFAULT_MAX_NODES, max_plies=None):
+        self.max_nodes = max_nodes
+        self.max_plies = max_plies  # Only look for mates within this many plies, None = no limit
+        self.proofs = {}
+        self.nodes = 0
+
+    def solve(self, board: chess.Board, max_nodes=None, should_stop=None):
+        # should_stop() is polled during the search; returning True gives up unproven
+        max_nodes = max_nodes or self.max_nodes
+        self.proofs = {}
+        self.nodes = 0
+        board = board.copy(stack=False)
+        root = Node(zobrist.board_hash(board), None, True)
+        path_keys = {root.key}
+        self.expand(board, root, path_keys, 0)
+        iterations = 0
+        while root.pn and root.dn and self.nodes < max_nodes:
+            iterations += 1
+            if should_stop is not None and iterations % STOP_CHECK_INTERVAL == 0 and should_stop():
+                break
+            # Walk down to the most proving node, then back up updating the numbers
+            path = [root]
+            node = root
+            while node.children:
+                if node.attacker:
+                    node = min(node.children, key=lambda child: child.pn)
+                else:
+                    node = min(node.children, key=lambda child: child.dn)
+                board.push(node.move)
+                path_keys.add(node.key)
+                path.append(node)
+            self.expand(board, node, path_keys, len(path) - 1)
+            for ply in range(len(path) - 1, -1, -1):
+                if ply < len(path) - 1:
+                    self.update(path[ply])
+                if ply:
+                    path_keys.discard(path[ply].key)
+                    board.pop()
+        if root.pn:
+            return MateResult(None, None, [], self.nodes)
+        plies, move = self.proofs[root.key]
+        return MateResult(move, (plies + 1) // 2, self.principal_variation(board), self.nodes)
+
+    def expand(self, board, node, path_keys, ply):
+        if board.is_fifty_moves() or (self.max_plies is not None and ply >= self.max_plies):
+            return self.disprove(node)
+        if node.attacker:
+            moves = [move for move in board.generate_legal_moves() if board.gives_check(move)]
+        else:
+            moves = list(board.generate_legal_moves())
+        if not moves:
+            if not node.attacker and board.is_check():
+                return self.prove(node, 0, None)
+            return self.disprove(node)  # No checks left, or stalemate
+        node.children = []
+        for move in moves:
+            self.nodes += 1
+            key = zobrist.push(board, move, node.key)
+            child = Node(key, move, not node.attacker)
+            if key in self.proofs:
+                child.pn, child.dn = 0, INFINITY
+            elif key in path_keys or board.is_insufficient_material():
+                child.pn, child.dn = INFINITY, 0
+            elif child.attacker:
+                pass  # Unknown until expanded: pn = dn = 1
+            else:
+                # Fewer replies means fewer positions to prove
+                replies = board.legal_moves.count()
+                if replies == 0:
+                    if board.is_check():
+                        self.proofs[key] = (0, None)
+                        child.pn, child.dn = 0, INFINITY
+                    else:
+                        child.pn, child.dn = INFINITY, 0
+                else:
+                    child.pn = replies
+            board.pop()
+            node.children.append(child)
+        self.update(node)
+
+    def update(self, node):
+        children = node.children
+        if node.attacker:
+            node.pn = min(child.pn for child in children)
+            node.dn = min(INFINITY, sum(child.dn for child in children))
+        else:
+            node.pn = min(INFINITY, sum(child.pn for child in children))
+            node.dn = min(child.dn for child in children)
+        if node.pn == 0:
+            # Attacker: the quickest proven mate; defender: the longest resistance
+            if node.attacker:
+                best = min((c for c in children if c.pn == 0), key=lambda c: self.proofs[c.key][0])
+                plies, move = self.proofs[best.key][0], best.move
+            else:
+                plies, move = max(self.proofs[c.key][0] for c in children), None
+            self.prove(node, plies + 1, move)
+        elif node.dn == 0:
+            self.disprove(node)
+
+    def prove(self, node, plies, move):
+        node.pn, node.dn = 0, INFINITY
+        node.children = None  # The proof lives on in self.proofs
+        self.proofs[node.key] = (plies, move)
+
+    def disprove(self, node):
+        node.pn, node.dn = INFINITY, 0
+        node.children = None
+
+    def principal_variation(self, board):
+        # Follow the proof tree: the attacker's mating move, the defender's longest defence
+        pv = []
+        key = zobrist.board_hash(board)
+        attacker = True
+        while True:
+            plies, move = self.proofs[key]
+            if plies == 0:
+                break
+            if not attacker:
+                # Only replies that were searched are in the table
+                replies = []
+                for reply in board.generate_legal_moves():
+                    child = zobrist.push(board, reply, key)
+                    board.pop()
+                    if child in self.proofs:
+                        replies.append((self.proofs[child][0], reply.uci(), reply))
+                if not replies:
+                    break
+                move = max(replies)[2]
+            pv.append(move)
+            key = zobrist.push(board, move, key)
+            attacker = not attacker
+        return pv
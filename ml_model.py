@@ -1,3 +1,5 @@
+import os
+import shutil
 import torch
 import torch.nn as nn
 import numpy as np
@@ -17,16 +19,19 @@ class BoardMLP(nn.Module):
         x = self.fc3(x)
         return x
 
-def board_to_tensor(board: chess.Board):
+def board_to_array(board: chess.Board, dtype=np.float32):
     # 12 planes: [P,N,B,R,Q,K,p,n,b,r,q,k] for each square
     piece_map = board.piece_map()
-    tensor = np.zeros((12, 8, 8), dtype=np.float32)
+    tensor = np.zeros((12, 8, 8), dtype=dtype)
     for square, piece in piece_map.items():
         idx = piece_type_to_index(piece)
         row = 7 - (square // 8)
         col = square % 8
-        tensor[idx, row, col] = 1.0
-    return torch.tensor(tensor.flatten()).unsqueeze(0)
+        tensor[idx, row, col] = 1
+    return tensor.flatten()
+
+def board_to_tensor(board: chess.Board):
+    return torch.tensor(board_to_array(board)).unsqueeze(0)
 
 def piece_type_to_index(piece):
     offset = 0 if piece.color == chess.WHITE else 6
@@ -46,11 +51,51 @@ def evaluate_board_ml(model, board):
         out = model(x)
         return float(out.item())
 
-def save_model(model, path):
-    torch.save(model.state_dict(), path)
+def save_model(model, path, version=None):
+    state = model.state_dict()
+    if version is not None:
+        state = {'version': version, 'state_dict': state}
+    torch.save(state, path)
 
 def load_model(path):
     model = BoardMLP()
-    model.load_state_dict(torch.load(path, map_location=torch.device('cpu')))
+    state = torch.load(path, map_location=torch.device('cpu'))
+    if 'state_dict' in state:
+        model.version = state['version']
+        state = state['state_dict']
+    model.load_state_dict(state)
     model.eval()
-    return model 
\ No newline at end of file
+    return model
+
+def publish_model(model, version, path='ml_model.pth', models_dir='models'):
+    # Keep a versioned copy, then atomically swap the live file so that
+    # watchers never load a half-written model
+    os.makedirs(models_dir, exist_ok=True)
+    versioned = os.path.join(models_dir, f'ml_model-v{version:04d}.pth')
+    save_model(model, versioned, version)
+    tmp = path + '.tmp'
+    shutil.copyfile(versioned, tmp)
+    os.replace(tmp, path)
+    return versioned
+
+# Reloads the model file when it changes; poll() between searches to hot-swap weights
+class ModelWatcher:
+    def __init__(self, path='ml_model.pth'):
+        self.path = path
+        self.stamp = None
+
+    def poll(self):
+        # Returns the newly loaded model, or None if the file is missing or unchanged
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self.stamp:
+            return None
+        model = load_model(self.path)
+        if not hasattr(model, 'version'):
+            # Unversioned file (plain train_ml.py output): keep cache keys distinct per file
+            model.version = f'mtime{st.st_mtime_ns}'
+        self.stamp = stamp
+        return model 
\ No newline at end of file
@@ -1,6 +1,14 @@
+import os
+import copy
+import json
+import time
+import hashlib
+import collections
 import chess
 import numpy as np
 import ml_model
+import evalcache
+import zobrist
 
 # Piece values for classic evaluation
 PIECE_VALUES = {
@@ -24,32 +32,104 @@ PAWN_TABLE = np.array([
     0, 0, 0, 0, 0, 0, 0, 0
 ])
 
+# Tables for every piece type, indexed by square from White's side (Black uses the mirror)
+PIECE_SQUARE_TABLES = {
+    chess.PAWN: PAWN_TABLE,
+    chess.KNIGHT: np.zeros(64),
+    chess.BISHOP: np.zeros(64),
+    chess.ROOK: np.zeros(64),
+    chess.QUEEN: np.zeros(64),
+    chess.KING: np.zeros(64),
+}
+PST_SCALE = 0.1  # Table entries are in tenths of a pawn
+
+# Tuned parameters written by texel_tune.py, loaded by Evaluator if present
+DEFAULT_PARAMS_PATH = os.path.join(os.path.dirname(__file__), 'eval_params.json')
+
+def load_params(path):
+    # Returns (piece_values, piece_square_tables); missing entries keep the defaults
+    with open(path) as f:
+        data = json.load(f)
+    values = dict(PIECE_VALUES)
+    tables = dict(PIECE_SQUARE_TABLES)
+    for symbol, value in data.get('piece_values', {}).items():
+        values[chess.Piece.from_symbol(symbol).piece_type] = float(value)
+    for symbol, table in data.get('piece_square_tables', {}).items():
+        tables[chess.Piece.from_symbol(symbol).piece_type] = np.array(table, dtype=float)
+    return values, tables
+
 # Modular evaluation function
 class Evaluator:
-    def __init__(self, use_ml=False, ml_model=None):
+    def __init__(self, use_ml=False, ml_model=None, cache=None, params_path=DEFAULT_PARAMS_PATH):
         self.use_ml = use_ml
         self.ml_model = ml_model  # Should be a loaded PyTorch model
+        self.cache = cache  # Optional evalcache.EvalCache shared across games
+        self.piece_values = PIECE_VALUES
+        self.piece_square_tables = PIECE_SQUARE_TABLES
+        self.params_id = None
+        if params_path and os.path.exists(params_path):
+            self.piece_values, self.piece_square_tables = load_params(params_path)
+            with open(params_path, 'rb') as f:
+                self.params_id = hashlib.sha1(f.read()).hexdigest()[:8]
+        # Plain lists index much faster than numpy arrays in the per-piece loop
+        self.square_values = {
+            piece_type: [float(self.piece_values.get(piece_type, 0) + v * PST_SCALE) for v in table]
+            for piece_type, table in self.piece_square_tables.items()
+        }
 
-    def evaluate(self, board: chess.Board):
+    @property
+    def version(self):
+        # Cache entries are only reused by the evaluator/model that produced them
+        if self.use_ml and self.ml_model:
+            return self.model_version()
+        return f'classic:{self.params_id}' if self.params_id else 'classic'
+
+    def model_version(self):
+        return f"ml:{getattr(self.ml_model, 'version', 0)}"
+
+    def refresh_model(self, watcher):
+        # Hot-swap newly published weights; only call between searches of the engines
+        # using this evaluator (searches running on a snapshot() are unaffected).
+        # Cached scores of every other model version go, also those of earlier runs
+        model = watcher.poll()
+        if model is None:
+            return False
+        self.ml_model = model
+        if self.cache is not None:
+            self.cache.retain(self.model_version(), 'ml:')
+        return True
+
+    def snapshot(self):
+        # Shallow copy bound to the current model and settings; shares the cache
+        return copy.copy(self)
+
+    def evaluate(self, board: chess.Board, key=None):
+        if self.cache is None:
+            return self.evaluate_uncached(board)
+        if key is None:
+            key = evalcache.position_key(board)
+        version = self.version
+        score = self.cache.get(key, version)
+        if score is None:
+            score = self.evaluate_uncached(board)
+            self.cache.put(key, version, score)
+        return score
+
+    def evaluate_uncached(self, board: chess.Board):
         if self.use_ml and self.ml_model:
             return ml_model.evaluate_board_ml(self.ml_model, board)
         else:
             return self.evaluate_classic(board)
 
     def evaluate_classic(self, board: chess.Board):
+        # Material plus piece-square bonus, precombined per piece type and square
         score = 0
-        for square in chess.SQUARES:
-            piece = board.piece_at(square)
-            if piece:
-                value = PIECE_VALUES.get(piece.piece_type, 0)
-                if piece.color == chess.WHITE:
-                    score += value
-                    if piece.piece_type == chess.PAWN:
-                        score += PAWN_TABLE[square] * 0.1
-                else:
-                    score -= value
-                    if piece.piece_type == chess.PAWN:
-                        score -= PAWN_TABLE[chess.square_mirror(square)] * 0.1
+        square_values = self.square_values
+        for square, piece in board.piece_map().items():
+            if piece.color == chess.WHITE:
+                score += square_values[piece.piece_type][square]
+            else:
+                score -= square_values[piece.piece_type][chess.square_mirror(square)]
         return score
 
     def evaluate_ml(self, board: chess.Board):
@@ -62,30 +142,384 @@ class Evaluator:
 # ml = load_model('ml_model.pth')
 # evaluator = Evaluator(use_ml=True, ml_model=ml)
 
-# Minimax with alpha-beta pruning
+# Selective search tuning (scores are in pawns, as returned by Evaluator)
+NULL_MOVE_R = 2          # Depth reduction for the null-move search
+NULL_MOVE_MIN_DEPTH = 3
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3        # Moves searched at full depth before reducing quiet moves
+FUTILITY_MARGINS = {1: 2.0, 2: 4.0}
+NULL_WINDOW = 0.01       # Smaller than any classic evaluation difference
+ASPIRATION_WINDOW = 0.5  # Initial half-width around the previous iteration's score
+MATE_SCORE = 1000.0      # Mate at ply p scores MATE_SCORE - p, so shorter mates score higher
+MATE_THRESHOLD = MATE_SCORE - 500
+DRAW_SCORE = 0.0
+INFINITE_SCORE = 1_000_000  # Window bound beyond any score; an int, so no float('inf') sentinels
+MATE_SOLVER_THRESHOLD = 3.0  # Static eval (pawns, side to move) at which to try the mate solver first
+MATE_SOLVER_TIME_SHARE = 0.25  # Part of a move's time limit the mate solver may use
+MATE_SOLVER_NODES = 5_000  # Node budget per solve without a time limit (roughly 0.25s)
+
+# One analysed line: score is from White's point of view, like Evaluator.evaluate
+PVLine = collections.namedtuple('PVLine', ['move', 'score', 'pv', 'depth'])
+
+# Moves until mate for a mate score (negative when being mated), else None
+def mate_in(score):
+    if score is None or abs(score) < MATE_THRESHOLD:
+        return None
+    plies = int(round(MATE_SCORE - abs(score)))
+    moves = (plies + 1) // 2
+    return moves if score > 0 else -moves
+
+# Inside the search moves are ints packing from | to << 6 | promotion << 12 (16 bits;
+# 0 is the null move). decode_move hands out one shared chess.Move per code, so move
+# lists and PVs hold plain ints and the search keeps no Move objects of its own alive
+MAX_PLY = 64  # Longest line a PV can hold
+_decoded_moves = {}
+
+def encode_move(move: chess.Move):
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+def decode_move(code):
+    move = _decoded_moves.get(code)
+    if move is None:
+        move = _decoded_moves[code] = chess.Move(code & 63, code >> 6 & 63, code >> 12 or None)
+    return move
+
+# Per-ply search state, allocated the first time a ply is reached and then reused
+# by every node at that ply
+class SearchPly:
+    __slots__ = ('moves', 'pv', 'pv_length')
+
+    def __init__(self):
+        self.moves = []          # Ordering key << 16 | move code, sorted best first
+        self.pv = [0] * MAX_PLY  # Triangular PV: the best line from this ply, as move codes
+        self.pv_length = 0
+
+# Raised inside the search when the time limit expires or stop() is called
+class SearchTimeout(Exception):
+    pass
+
+# Negamax alpha-beta; the selective techniques are off by default and can be
+# switched on individually to compare nodes-to-depth and move quality
 class MyEngine:
-    def __init__(self, evaluator: Evaluator, depth=2):
+    def __init__(self, evaluator: Evaluator, depth=2, time_limit=None,
+                 pvs=False, null_move=False, lmr=False, futility=False, mate_solver=None):
         self.evaluator = evaluator
         self.depth = depth
+        self.time_limit = time_limit  # Seconds per move, None = fixed depth only
+        self.pvs = pvs
+        self.null_move = null_move
+        self.lmr = lmr
+        self.futility = futility
+        self.mate_solver = mate_solver  # mate_search.MateSolver, tried in lopsided positions
+        self.mate_failed = set()  # Zobrist keys of positions the solver found no mate in
+        self.mate_failed_material = None  # Material those keys were recorded with
+        self.deadline = None
+        self.stopped = False
+        self.nodes = 0
+        self.best_move = None
+        self.best_score = None  # From the side to move's point of view
+        self.pv = []
+        self.stack = []  # SearchPly per ply
+        self.excluded_root_moves = ()
+        self.root_key = None
+        self.hash_history = []  # Zobrist keys of the game and search path above the current node
+
+    def stop(self):
+        # Safe to call from another thread; the search returns its best move so far.
+        # Stays set until the search it stops ends, so a stop issued just before the
+        # search starts isn't lost; the engine can search again afterwards
+        self.stopped = True
 
-    def choose_move(self, board: chess.Board):
-        best_score = float('-inf') if board.turn == chess.WHITE else float('inf')
+    def choose_move(self, board: chess.Board, time_limit=None):
+        if time_limit is None:
+            time_limit = self.time_limit
+        self.nodes = 0
+        self.best_move = None
+        self.prepare(board)
+        root_ply = len(board.move_stack)
         best_move = None
-        for move in board.legal_moves:
-            board.push(move)
-            score = self.minimax(board, self.depth-1, float('-inf'), float('inf'), not board.turn)
-            board.pop()
-            if board.turn == chess.WHITE:
-                if score > best_score:
-                    best_score = score
-                    best_move = move
+        try:
+            mate_move = self.solve_mate(board, time_limit)
+            if mate_move is not None:
+                return mate_move
+            if time_limit is None:
+                self.deadline = None
+                best_move = self.search_root(board, self.depth)
             else:
-                if score < best_score:
-                    best_score = score
-                    best_move = move
+                # Iterative deepening: keep the best move of the last completed depth
+                self.deadline = time.monotonic() + time_limit
+                for depth in range(1, self.depth + 1):
+                    best_move = self.search_root(board, depth)
+        except SearchTimeout:
+            while len(board.move_stack) > root_ply:
+                board.pop()
+            if time_limit is None:
+                best_move = self.best_move  # Best root move searched before the stop
+        finally:
+            self.deadline = None
+            self.stopped = False
+        if best_move is None:
+            best_move = next(iter(board.legal_moves), None)
         return best_move
 
+    def solve_mate(self, board: chess.Board, time_limit=None):
+        # A forced mate that fixed-depth search would miss or find only at great cost.
+        # Gets a share of the time limit, or a small node budget at fixed depth, so it
+        # can be tried on every move of a won position. Positions it failed in are
+        # skipped until the material changes (a capture or promotion can open a mate)
+        if self.mate_solver is None or self.evaluate_relative(board, self.root_key) < MATE_SOLVER_THRESHOLD:
+            return None
+        material = tuple(chess.popcount(mask) for mask in (
+            board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.occupied_co[chess.WHITE]))
+        if material != self.mate_failed_material:
+            self.mate_failed = set()
+            self.mate_failed_material = material
+        if self.root_key in self.mate_failed:
+            return None
+        if time_limit is None:
+            deadline = None
+            max_nodes = min(MATE_SOLVER_NODES, self.mate_solver.max_nodes)
+        else:
+            deadline = time.monotonic() + time_limit * MATE_SOLVER_TIME_SHARE
+            max_nodes = None
+
+        def should_stop():
+            return self.stopped or (deadline is not None and time.monotonic() > deadline)
+
+        result = self.mate_solver.solve(board, max_nodes=max_nodes, should_stop=should_stop)
+        self.nodes += result.nodes
+        if result.move is None:
+            if not self.stopped:
+                self.mate_failed.add(self.root_key)
+            return None
+        self.best_move = result.move
+        self.best_score = MATE_SCORE - (2 * result.mate - 1)
+        self.pv = result.pv
+        return result.move
+
+    def prepare(self, board: chess.Board):
+        # Keys of the game positions since the last capture or pawn move, for repetition checks
+        self.root_key = zobrist.board_hash(board)
+        history = []
+        replay = board.copy()
+        for _ in range(min(board.halfmove_clock, len(board.move_stack))):
+            replay.pop()
+            history.append(zobrist.board_hash(replay))
+        history.reverse()
+        self.hash_history = history
+
+    def is_repetition(self, key, halfmove_clock):
+        # Only positions with the same side to move, back to the last irreversible move
+        history = self.hash_history
+        n = len(history)
+        for i in range(2, min(halfmove_clock, n) + 1, 2):
+            if history[n - i] == key:
+                return True
+        return False
+
+    def check_time(self):
+        if self.stopped or (self.deadline is not None and time.monotonic() > self.deadline):
+            raise SearchTimeout()
+
+    def search_root(self, board: chess.Board, depth, alpha=-INFINITE_SCORE, beta=INFINITE_SCORE):
+        self.best_score = self.search(board, depth, alpha, beta, 0, self.root_key)
+        root = self.stack[0]
+        self.pv = [decode_move(code) for code in root.pv[:root.pv_length]]
+        return self.best_move
+
+    def analyse(self, board: chess.Board, multipv=3, depth=None, time_limit=None, callback=None):
+        # Top-N root moves with scores and principal variations from a single
+        # iterative-deepening search. Line k at depth d excludes the moves of
+        # lines 0..k-1 and is searched in an aspiration window around line k's
+        # score from depth d-1. callback(lines) is called after every depth.
+        depth = depth or self.depth
+        if time_limit is None:
+            time_limit = self.time_limit
+        self.nodes = 0
+        self.prepare(board)
+        self.deadline = time.monotonic() + time_limit if time_limit is not None else None
+        root_ply = len(board.move_stack)
+        sign = 1 if board.turn == chess.WHITE else -1
+        multipv = min(multipv, board.legal_moves.count())
+        lines = []
+        try:
+            for d in range(1, depth + 1):
+                new_lines = []
+                for k in range(multipv):
+                    self.excluded_root_moves = [line.move for line in new_lines]
+                    previous = lines[k] if k < len(lines) else None
+                    self.best_move = previous.move if previous else None
+                    score = self.aspiration_search(board, d, previous.score * sign if previous else None)
+                    new_lines.append(PVLine(self.best_move, float(score * sign), self.pv, d))
+                new_lines.sort(key=lambda line: line.score * sign, reverse=True)
+                lines = new_lines
+                if callback:
+                    callback(lines)
+        except SearchTimeout:
+            while len(board.move_stack) > root_ply:
+                board.pop()
+        finally:
+            self.deadline = None
+            self.stopped = False
+            self.excluded_root_moves = ()
+        return lines
+
+    def aspiration_search(self, board: chess.Board, depth, guess):
+        if guess is None:
+            self.search_root(board, depth)
+            return self.best_score
+        window = ASPIRATION_WINDOW
+        alpha, beta = guess - window, guess + window
+        while True:
+            self.search_root(board, depth, alpha, beta)
+            score = self.best_score
+            if score <= alpha:
+                alpha = score - window
+            elif score >= beta:
+                beta = score + window
+            else:
+                return score
+            window *= 2
+
+    def evaluate_relative(self, board: chess.Board, key=None):
+        score = self.evaluator.evaluate(board, key)
+        return score if board.turn == chess.WHITE else -score
+
+    def order_moves(self, board: chess.Board, moves, first=0, excluded=()):
+        # Fills `moves` with the legal moves as (priority, generation order) << 16 | code,
+        # best first: the previous iteration's best move, then captures (MVV-LVA),
+        # promotions, quiet moves; equal priorities keep move generation order
+        moves.clear()
+        for i, move in enumerate(board.generate_legal_moves()):
+            code = encode_move(move)
+            if code in excluded:
+                continue
+            if code == first:
+                priority = 1000
+            elif board.is_capture(move):
+                victim = board.piece_type_at(move.to_square) or chess.PAWN  # En passant
+                priority = 100 + 10 * victim - board.piece_type_at(move.from_square)
+            elif move.promotion:
+                priority = 90 + move.promotion
+            else:
+                priority = 0
+            moves.append((priority << 8 | 255 - i) << 16 | code)
+        moves.sort(reverse=True)
+        return moves
+
+    def has_non_pawn_material(self, board: chess.Board, color):
+        return bool(board.occupied_co[color] & ~(board.pawns | board.kings))
+
+    def search(self, board, depth, alpha, beta, ply, key=None, allow_null=True):
+        self.check_time()
+        self.nodes += 1
+        while len(self.stack) <= ply + 1:
+            self.stack.append(SearchPly())
+        node = self.stack[ply]
+        node.pv_length = 0
+        if key is None:
+            key = zobrist.board_hash(board)
+        if ply > 0 and self.is_repetition(key, board.halfmove_clock):
+            return DRAW_SCORE
+        in_check = board.is_check()
+        if depth <= 0:
+            # Leaves only look for moves when in check, to recognise mate
+            if in_check and not any(board.generate_legal_moves()):
+                return -(MATE_SCORE - ply)
+            return self.evaluate_relative(board, key)
+
+        # Terminal detection from the one move list this node generates anyway
+        first = 0
+        excluded = ()
+        if ply == 0:
+            first = encode_move(self.best_move) if self.best_move else 0
+            excluded = {encode_move(move) for move in self.excluded_root_moves}
+        moves = self.order_moves(board, node.moves, first, excluded)
+        if not moves:
+            if excluded:
+                return -INFINITE_SCORE  # Every root move is excluded
+            return -(MATE_SCORE - ply) if in_check else DRAW_SCORE
+        if ply > 0:
+            # At the root the game isn't over yet, so a move must still be chosen
+            if board.halfmove_clock >= 100:
+                return DRAW_SCORE
+            if chess.popcount(board.occupied) <= 4 and board.is_insufficient_material():
+                return DRAW_SCORE
+
+        # Null-move pruning: if passing still fails high, a real move will too.
+        # Skipped in check and without pieces, where zugzwang makes passing unsound
+        if (self.null_move and allow_null and ply > 0 and not in_check
+                and depth >= NULL_MOVE_MIN_DEPTH
+                and self.has_non_pawn_material(board, board.turn)):
+            self.hash_history.append(key)
+            null_key = zobrist.push(board, chess.Move.null(), key)
+            score = -self.search(board, depth - 1 - NULL_MOVE_R, -beta, -beta + NULL_WINDOW, ply + 1, null_key, allow_null=False)
+            board.pop()
+            self.hash_history.pop()
+            if score >= beta:
+                return score
+
+        # Futility pruning: near the leaves, quiet moves can't lift a hopeless static eval above alpha
+        static_eval = None
+        if self.futility and ply > 0 and not in_check and depth in FUTILITY_MARGINS:
+            static_eval = self.evaluate_relative(board, key)
+            if static_eval + FUTILITY_MARGINS[depth] > alpha:
+                static_eval = None
+
+        best_score = -INFINITE_SCORE
+        best_code = 0
+        self.hash_history.append(key)
+        for i, entry in enumerate(moves):
+            code = entry & 0xFFFF
+            move = decode_move(code)
+            quiet = not board.is_capture(move) and not move.promotion
+            child_key = zobrist.push(board, move, key)
+            gives_check = board.is_check()
+            if static_eval is not None and i > 0 and quiet and not gives_check:
+                board.pop()
+                continue
+            if i == 0:
+                score = -self.search(board, depth - 1, -beta, -alpha, ply + 1, child_key)
+            else:
+                # Late-move reductions: quiet moves late in the ordering get one ply less
+                reduction = 0
+                if (self.lmr and ply > 0 and depth >= LMR_MIN_DEPTH and i >= LMR_MIN_MOVES
+                        and quiet and not in_check and not gives_check):
+                    reduction = 1
+                if self.pvs:
+                    # Principal-variation search: prove the move is worse with a null window
+                    score = -self.search(board, depth - 1 - reduction, -alpha - NULL_WINDOW, -alpha, ply + 1, child_key)
+                    if reduction and score > alpha:
+                        score = -self.search(board, depth - 1, -alpha - NULL_WINDOW, -alpha, ply + 1, child_key)
+                    if alpha < score < beta:
+                        score = -self.search(board, depth - 1, -beta, -alpha, ply + 1, child_key)
+                else:
+                    score = -self.search(board, depth - 1 - reduction, -beta, -alpha, ply + 1, child_key)
+                    if reduction and score > alpha:
+                        score = -self.search(board, depth - 1, -beta, -alpha, ply + 1, child_key)
+            board.pop()
+            if score > best_score:
+                best_score = score
+                best_code = code
+                if ply == 0:
+                    self.best_move = move  # Kept if the search is stopped before the root finishes
+                if score > alpha:
+                    alpha = score
+                    child = self.stack[ply + 1]
+                    n = child.pv_length
+                    node.pv[0] = code
+                    node.pv[1:n + 1] = child.pv[:n]
+                    node.pv_length = n + 1
+                    if alpha >= beta:
+                        break
+        self.hash_history.pop()
+        if ply == 0:
+            self.best_move = decode_move(best_code) if best_code else None
+        return best_score
+
+    # Plain minimax over every move at full depth, kept as the reference search
     def minimax(self, board, depth, alpha, beta, maximizing):
+        self.check_time()
         if depth == 0 or board.is_game_over():
             return self.evaluator.evaluate(board)
         if maximizing:
@@ -1,44 +1,355 @@
+import argparse
+import collections
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import multiprocessing as mp
 import chess
 import myengine
 import ml_model
 import numpy as np
+import zobrist
+from evalcache import EvalCache
 
 NUM_GAMES = 10
 MAX_MOVES = 80
 DEPTH = 2
+RANDOM_OPENING_PLIES = 6  # Random moves at the start of each game, so games differ
+WORKER_POLL = 1.0  # Seconds between checks for crashed self-play workers
+GAMES_PER_WORKER = 8  # Concurrent games (threads) per batched self-play worker process
+EVAL_CACHE_PATH = 'eval_cache.sqlite'
+MODEL_PATH = 'ml_model.pth'
+DATA_PATH = 'selfplay_data.npz'
 
-def play_game():
+def save_data(X, y, out_path=DATA_PATH):
+    # A directory gets a new uniquely named shard (picked up by train_loop.py).
+    # Written under a temporary name first so readers never see a partial file.
+    if os.path.isdir(out_path):
+        out_path = os.path.join(out_path, f'shard-{time.time_ns()}-{os.getpid()}.npz')
+    tmp = out_path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, X=X, y=y)
+    os.replace(tmp, out_path)
+    return out_path
+
+# Adjudication rules; scores are in pawns from White's point of view
+ADJUDICATION = {
+    'resign_score': 5.0,   # Resign once |eval| stays at or above this ...
+    'resign_plies': 6,     # ... for this many consecutive plies
+    'draw_score': 0.2,     # Draw once |eval| stays at or below this ...
+    'draw_plies': 20,      # ... for this many consecutive plies
+    'draw_min_ply': 30,    # ... but never before this ply
+    'repetition': True,    # Draw on the first threefold repetition (by Zobrist key)
+    'endgames': True,      # Decide trivial endgames without playing them out
+}
+
+# The ML evaluator is trained on results (-1, 0, 1), so its scores are in result units,
+# not pawns. An untrained or early model scores nearly every position close to 0, so
+# eval-based draws are off: they would feed the training loop its own draw labels
+ML_ADJUDICATION = dict(ADJUDICATION, resign_score=0.9)
+del ML_ADJUDICATION['draw_score']
+
+def attacker_win_certain(board):
+    # Bare king to move against queen/rook: the win is only certain if it isn't
+    # stalemated and can't take a piece the attacker needs to mate
+    moves = list(board.generate_legal_moves())
+    if not moves:
+        return False
+    for move in moves:
+        if board.is_capture(move):
+            board.push(move)
+            heavy = board.occupied_co[board.turn] & (board.queens | board.rooks)
+            board.pop()
+            if not heavy:
+                return False
+    return True
+
+def trivial_endgame(board):
+    # 1/-1/0 for endgames whose result is not in doubt, None otherwise
+    if board.pawns:
+        return None
+    for color in chess.COLORS:
+        own = board.occupied_co[color]
+        other = board.occupied_co[not color]
+        if own == board.kings & own and other & (board.queens | board.rooks):
+            if board.turn == color and not attacker_win_certain(board):
+                return None
+            return -1 if color == chess.WHITE else 1
+    if board.queens or board.rooks:
+        return None
+    if all(chess.popcount(board.occupied_co[color]) <= 2 for color in chess.COLORS):
+        return 0  # At most one minor piece each
+    return None
+
+def new_stats():
+    return {'games': 0, 'plies': 0, 'plies_saved': 0, 'reasons': collections.Counter()}
+
+def merge_stats(total, stats):
+    for name in ('games', 'plies', 'plies_saved'):
+        total[name] += stats[name]
+    total['reasons'].update(stats['reasons'])
+
+def print_stats(stats):
+    games = stats['games'] or 1
+    print(f"Adjudication: {stats['plies']} plies played, {stats['plies_saved']} saved "
+          f"({stats['plies'] / games:.1f} played, {stats['plies_saved'] / games:.1f} saved per game)")
+    for reason, count in stats['reasons'].most_common():
+        print(f"  {reason:<12}{count}")
+
+def play_game(evaluator=None, adjudication=ADJUDICATION, stats=None, rng=None,
+              opening_plies=RANDOM_OPENING_PLIES):
+    # Returns (positions, score): positions as (N, 768) uint8 board_to_array planes,
+    # score 1=white win, -1=black win, 0=draw. The search is deterministic, so the
+    # first opening_plies moves are picked by rng to make every game different
     board = chess.Board()
-    evaluator = myengine.Evaluator(use_ml=False)
+    if rng is None:
+        rng = random.Random()
+    if evaluator is None:
+        evaluator = myengine.Evaluator(use_ml=False)
     engine = myengine.MyEngine(evaluator, depth=DEPTH)
+    rules = adjudication or {}
+    key = zobrist.board_hash(board)
+    seen = collections.Counter([key])
+    resign_run = 0
+    draw_run = 0
+    last_score = 0.0
     positions = []
+    score = None
+    reason = None
     while not board.is_game_over() and len(positions) < MAX_MOVES:
-        positions.append(board.copy())
+        # Planes only; a board.copy() per ply would also copy the whole move stack
+        positions.append(ml_model.board_to_array(board, dtype=np.uint8))
+        if len(board.move_stack) < opening_plies:
+            key = zobrist.push(board, rng.choice(list(board.legal_moves)), key)
+            seen[key] += 1
+            continue
         move = engine.choose_move(board)
-        if move:
-            board.push(move)
-        else:
+        if not move:
             break
-    # Assign final score: 1=white win, -1=black win, 0=draw
-    if board.is_checkmate():
-        score = 1 if board.turn == chess.BLACK else -1
-    else:
-        score = 0
-    return positions, score
-
-def generate_selfplay_data(num_games=NUM_GAMES):
+        white_score = engine.best_score if board.turn == chess.WHITE else -engine.best_score
+        key = zobrist.push(board, move, key)
+        seen[key] += 1
+        if 'resign_score' in rules:
+            if abs(white_score) < rules['resign_score']:
+                resign_run = 0
+            elif resign_run and (white_score > 0) != (last_score > 0):
+                resign_run = 1
+            else:
+                resign_run += 1
+            last_score = white_score
+            if resign_run >= rules['resign_plies']:
+                score, reason = (1 if white_score > 0 else -1), 'resign'
+                break
+        if 'draw_score' in rules:
+            draw_run = draw_run + 1 if abs(white_score) <= rules['draw_score'] else 0
+            if draw_run >= rules['draw_plies'] and len(positions) >= rules.get('draw_min_ply', 0):
+                score, reason = 0, 'draw'
+                break
+        if rules.get('repetition') and seen[key] >= 3:
+            score, reason = 0, 'repetition'
+            break
+        if rules.get('endgames'):
+            score = trivial_endgame(board)
+            if score is not None:
+                reason = 'endgame'
+                break
+    if reason is None:
+        if board.is_checkmate():
+            score, reason = (1 if board.turn == chess.BLACK else -1), 'checkmate'
+        else:
+            score = 0
+            reason = 'move limit' if len(positions) >= MAX_MOVES else 'draw rule'
+    if stats is not None:
+        stats['games'] += 1
+        stats['plies'] += len(positions)
+        stats['reasons'][reason] += 1
+        if reason in ('resign', 'draw', 'repetition', 'endgame'):
+            # Upper bound: the game could still have ended before the move cap
+            stats['plies_saved'] += MAX_MOVES - len(positions)
+    return np.stack(positions), score
+
+def generate_selfplay_data(num_games=NUM_GAMES, cache_path=EVAL_CACHE_PATH, out_path=DATA_PATH,
+                           adjudication=ADJUDICATION, seed=None):
+    # One evaluation cache for the whole run, so openings are scored only once
+    cache = EvalCache(path=cache_path)
+    evaluator = myengine.Evaluator(use_ml=False, cache=cache)
+    cache.warm(version=evaluator.version)
     X = []
     y = []
+    stats = new_stats()
+    rng = random.Random(seed)
     for i in range(num_games):
-        positions, result = play_game()
-        for board in positions:
-            X.append(ml_model.board_to_tensor(board).numpy().flatten())
-            y.append([result])
+        positions, result = play_game(evaluator, adjudication, stats, rng)
+        X.append(positions)
+        y.extend([[result]] * len(positions))
         print(f"Game {i+1}/{num_games} complete, result: {result}")
-    X = np.stack(X)
+    X = np.concatenate(X).astype(np.float32)
     y = np.stack(y)
-    np.savez('selfplay_data.npz', X=X, y=y)
-    print(f"Saved {len(X)} positions to selfplay_data.npz")
+    path = save_data(X, y, out_path)
+    print(f"Saved {len(X)} positions to {path}")
+    print_stats(stats)
+    print(f"Eval cache: {cache.stats()}")
+    cache.close()
+
+# Worker process for batched self-play: one game thread per inference client, and every
+# leaf evaluation goes to the server. A thread waiting for its score lets the others
+# search, so each process keeps several requests in flight and batches can fill up.
+# clients is [(client_id, games)], responses maps client_id to its response queue.
+# Messages on the results queue: ('game', positions, result) per game, then
+# ('done', client_id, adjudication stats) once a client has played all its games
+def batched_selfplay_worker(clients, requests, responses, results, version,
+                            adjudication=ADJUDICATION, seed=None):
+    import batch_inference
+    cache = EvalCache()  # Shared by the threads; it has its own lock
+    failed = []
+
+    def play(client_id, num_games):
+        try:
+            client = batch_inference.InferenceClient(client_id, requests, responses[client_id], version=version)
+            evaluator = batch_inference.BatchedEvaluator(client, cache=cache)
+            # Each client has its own opening moves; a fixed seed makes the run reproducible
+            rng = random.Random(None if seed is None else f'{seed}:{client_id}')
+            stats = new_stats()
+            for _ in range(num_games):
+                positions, result = play_game(evaluator, adjudication, stats, rng)
+                results.put(('game', positions, result))
+            results.put(('done', client_id, stats))
+        except BaseException:
+            failed.append(client_id)
+            raise
+
+    threads = [threading.Thread(target=play, args=client) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if failed:
+        sys.exit(1)  # Lets the collector count the failed clients as finished
+
+def generate_selfplay_data_batched(num_games=NUM_GAMES, workers=4, model_path=MODEL_PATH,
+                                   max_batch=None, max_wait=None, out_path=DATA_PATH,
+                                   adjudication=ML_ADJUDICATION, seed=None, games_per_worker=GAMES_PER_WORKER):
+    # Many games at once in worker processes, with ML evaluation batched by one server.
+    # A batch holds at most one position per concurrent game, so max_batch is only
+    # reached with workers * games_per_worker >= max_batch
+    import batch_inference
+    watcher = ml_model.ModelWatcher(model_path)
+    model = watcher.poll()
+    if model is None:
+        print(f"Warning: {model_path} not found, using an untrained model")
+        model = ml_model.BoardMLP()
+    num_clients = min(num_games, workers * games_per_worker)
+    workers = min(workers, num_clients)
+    requests = mp.Queue()
+    responses = [mp.Queue() for _ in range(num_clients)]
+    results = mp.Queue()
+    owner = {}  # client_id -> index of its worker process
+    procs = []
+    for i in range(workers):
+        clients = []
+        for client_id in range(i, num_clients, workers):
+            games = num_games // num_clients + (1 if client_id < num_games % num_clients else 0)
+            clients.append((client_id, games))
+            owner[client_id] = i
+        proc = mp.Process(target=batched_selfplay_worker,
+                          args=(clients, requests, {c: responses[c] for c, _ in clients}, results,
+                                getattr(model, 'version', 0), adjudication, seed),
+                          daemon=True)
+        proc.start()
+        procs.append(proc)
+    # Start the server thread only after forking the workers
+    server = batch_inference.InferenceServer(
+        model, requests, responses,
+        max_batch=max_batch or batch_inference.DEFAULT_MAX_BATCH,
+        max_wait=max_wait or batch_inference.DEFAULT_MAX_WAIT,
+        watcher=watcher)
+    server.start()
+    X = []
+    y = []
+    stats = new_stats()
+    finished = set()
+    games_done = 0
+    while len(finished) < num_clients:
+        try:
+            item = results.get(timeout=WORKER_POLL)
+        except queue.Empty:
+            # Clients of a worker that exits with an error never send 'done'; a clean
+            # exit flushes its messages first, so only non-zero exit codes count
+            for i, proc in enumerate(procs):
+                if proc.exitcode in (None, 0):
+                    continue
+                lost = [c for c, w in owner.items() if w == i and c not in finished]
+                if lost:
+                    print(f"Warning: worker {i} died (exit code {proc.exitcode}), "
+                          f"the remaining games of {len(lost)} clients are lost")
+                for client_id in lost:
+                    finished.add(client_id)
+                    server.client_done()
+            continue
+        if item[0] == 'done':
+            _, client_id, client_stats = item
+            merge_stats(stats, client_stats)
+            if client_id not in finished:
+                finished.add(client_id)
+                server.client_done()
+            continue
+        _, positions, result = item
+        X.append(positions)
+        y.extend([[result]] * len(positions))
+        games_done += 1
+        print(f"Game {games_done}/{num_games} complete, result: {result}")
+    server.stop()
+    for proc in procs:
+        proc.join()
+    if not X:
+        print("No games completed, nothing saved")
+        return
+    X = np.concatenate(X).astype(np.float32)
+    y = np.array(y, dtype=np.float32)
+    path = save_data(X, y, out_path)
+    print(f"Saved {len(X)} positions to {path}")
+    print_stats(stats)
+    server.print_stats()
 
 if __name__ == '__main__':
-    generate_selfplay_data() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Generate self-play training data')
+    parser.add_argument('--games', type=int, default=NUM_GAMES)
+    parser.add_argument('--ml', action='store_true', help='Batched ML evaluation with concurrent games')
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes in --ml mode')
+    parser.add_argument('--games-per-worker', type=int, default=GAMES_PER_WORKER,
+                        help='Concurrent games per worker in --ml mode; batches hold one position per game')
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--max-batch', type=int, default=None)
+    parser.add_argument('--max-wait', type=float, default=None, help='Seconds to wait for a batch to fill')
+    parser.add_argument('--out', default=DATA_PATH, help='Output file, or a directory to write new shards into')
+    parser.add_argument('--rounds', type=int, default=1, help='Batches of games to generate, 0 = forever')
+    parser.add_argument('--no-adjudication', action='store_true', help='Play every game to mate or the move cap')
+    parser.add_argument('--resign-score', type=float, default=None,
+                        help=f"Pawns, or result units with --ml (default {ADJUDICATION['resign_score']} / "
+                             f"{ML_ADJUDICATION['resign_score']})")
+    parser.add_argument('--resign-plies', type=int, default=ADJUDICATION['resign_plies'])
+    parser.add_argument('--draw-score', type=float, default=None,
+                        help=f"Same units as --resign-score (default {ADJUDICATION['draw_score']}, off with --ml)")
+    parser.add_argument('--draw-plies', type=int, default=ADJUDICATION['draw_plies'])
+    parser.add_argument('--seed', type=int, default=None, help='Seed for the random opening moves')
+    args = parser.parse_args()
+    adjudication = None
+    if not args.no_adjudication:
+        adjudication = dict(ML_ADJUDICATION if args.ml else ADJUDICATION,
+                            resign_plies=args.resign_plies, draw_plies=args.draw_plies)
+        if args.resign_score is not None:
+            adjudication['resign_score'] = args.resign_score
+        if args.draw_score is not None:
+            adjudication['draw_score'] = args.draw_score
+    round_no = 0
+    while args.rounds == 0 or round_no < args.rounds:
+        seed = None if args.seed is None else f'{args.seed}:{round_no}'
+        if args.ml:
+            generate_selfplay_data_batched(args.games, args.workers, args.model, args.max_batch, args.max_wait,
+                                           args.out, adjudication, seed, args.games_per_worker)
+        else:
+            generate_selfplay_data(args.games, out_path=args.out, adjudication=adjudication, seed=seed)
+        round_no += 1 
\ No newline at end of file
@@ -0,0 +1,211 @@
+import argparse
+import json
+import time
+import zipfile
+
+import chess
+import chess.pgn
+import numpy as np
+import myengine
+
+# The classic eval is linear in piece placement: every (piece type, square) has one
+# weight = piece value + PST_SCALE * table entry. Features are the white-minus-black
+# counts per (piece type, table square), table squares seen from each side's own view.
+NUM_FEATURES = 6 * 64
+CHUNK_ROWS = 16384  # Rows converted to float32 at a time, when loading and in every pass
+RESULTS = {'1-0': 1, '0-1': -1, '1/2-1/2': 0}
+
+# Table square for a plane index of ml_model.board_to_array (row 0 = rank 8):
+# White pieces sit on square = index ^ 56, Black pieces on mirror(square) = index
+_WHITE_ORDER = np.array([sq ^ 56 for sq in range(64)])
+
+def features_from_planes(X):
+    # (N, 768) self-play planes -> (N, 384) int8 features, vectorized over all rows
+    planes = X.reshape(-1, 12, 64).astype(np.int8)
+    white = planes[:, :6, :][:, :, _WHITE_ORDER]
+    black = planes[:, 6:, :]
+    return (white - black).reshape(-1, NUM_FEATURES)
+
+def board_features(board: chess.Board):
+    f = np.zeros((6, 64), dtype=np.int8)
+    for square, piece in board.piece_map().items():
+        if piece.color == chess.WHITE:
+            f[piece.piece_type - 1, square] += 1
+        else:
+            f[piece.piece_type - 1, chess.square_mirror(square)] -= 1
+    return f.reshape(NUM_FEATURES)
+
+def iter_npz_rows(path, name, rows=CHUNK_ROWS):
+    # Streams an array of an uncompressed or compressed .npz in blocks of rows, so a
+    # float32 shard is never in memory whole
+    with zipfile.ZipFile(path) as archive, archive.open(name + '.npy') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        if fortran_order or dtype.hasobject:
+            with np.load(path) as data:
+                array = data[name]
+            for start in range(0, len(array), rows):
+                yield array[start:start + rows]
+            return
+        row_shape = shape[1:]
+        row_bytes = int(np.prod(row_shape, dtype=np.int64)) * dtype.itemsize
+        for start in range(0, shape[0], rows):
+            count = min(rows, shape[0] - start)
+            yield np.frombuffer(f.read(count * row_bytes), dtype=dtype).reshape((count,) + row_shape)
+
+def load_npz(path):
+    with np.load(path) as data:
+        y = data['y'].reshape(-1).astype(np.float32)
+    F = np.empty((len(y), NUM_FEATURES), dtype=np.int8)
+    row = 0
+    for X in iter_npz_rows(path, 'X'):
+        F[row:row + len(X)] = features_from_planes(X)
+        row += len(X)
+    return F, y
+
+def load_pgn(path, skip_plies=8):
+    # Every mainline position after the opening, labelled with the game result
+    features = []
+    labels = []
+    with open(path, encoding='utf-8', errors='replace') as f:
+        while True:
+            game = chess.pgn.read_game(f)
+            if game is None:
+                break
+            result = RESULTS.get(game.headers.get('Result'))
+            if result is None:
+                continue
+            board = game.board()
+            for ply, move in enumerate(game.mainline_moves()):
+                board.push(move)
+                if ply + 1 >= skip_plies:
+                    features.append(board_features(board))
+                    labels.append(result)
+    if not features:
+        return np.zeros((0, NUM_FEATURES), dtype=np.int8), np.zeros(0, dtype=np.float32)
+    return np.stack(features), np.array(labels, dtype=np.float32)
+
+def load_dataset(paths, skip_plies):
+    parts = [load_pgn(p, skip_plies) if p.lower().endswith('.pgn') else load_npz(p) for p in paths]
+    if len(parts) == 1:
+        F, results = parts[0]
+    else:
+        F = np.concatenate([p[0] for p in parts])
+        results = np.concatenate([p[1] for p in parts])
+    return F, (results + 1) / 2  # -1/0/1 -> 0/0.5/1
+
+def initial_weights(evaluator):
+    W = np.zeros((6, 64))
+    for piece_type in chess.PIECE_TYPES:
+        W[piece_type - 1] = evaluator.square_values[piece_type]
+    return W.reshape(NUM_FEATURES)
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+def logistic_loss(evals, targets, k):
+    p = np.clip(sigmoid(k * evals), 1e-7, 1 - 1e-7)
+    return float(-np.mean(targets * np.log(p) + (1 - targets) * np.log(1 - p)))
+
+def chunks(F):
+    # float32 blocks of the int8 features for the BLAS matmuls
+    for start in range(0, len(F), CHUNK_ROWS):
+        yield start, F[start:start + CHUNK_ROWS].astype(np.float32)
+
+def evaluate(F, w):
+    evals = np.empty(len(F), dtype=np.float32)
+    for start, chunk in chunks(F):
+        evals[start:start + len(chunk)] = chunk @ w
+    return evals
+
+def loss_and_gradient(F, w, targets, k):
+    # Both in one pass over F: each row's residual only needs that row's eval
+    loss = 0.0
+    grad = np.zeros_like(w)
+    for start, chunk in chunks(F):
+        t = targets[start:start + len(chunk)]
+        s = sigmoid(k * (chunk @ w))
+        p = np.clip(s, 1e-7, 1 - 1e-7)
+        loss -= float(np.sum(t * np.log(p) + (1 - t) * np.log(1 - p)))
+        grad += (s - t) @ chunk
+    n = len(F)
+    return loss / n, k * grad / n
+
+def fit_scale(evals, targets):
+    # Texel's K: the eval -> win probability scale that best fits the current weights
+    candidates = np.linspace(0.05, 3.0, 60)
+    losses = [logistic_loss(evals, targets, k) for k in candidates]
+    return float(candidates[int(np.argmin(losses))])
+
+def tune(F, targets, w0, iterations=200, lr=0.05, l2=1e-4, tol=1e-6, patience=10):
+    # Full-batch Adam on the logistic loss. F stays int8 (384 bytes per position); the
+    # products run as BLAS matmuls over float32 chunks of it. L2 pulls rarely seen
+    # weights towards their start. Stops once the loss has improved by less than tol
+    # per iteration over the last `patience` iterations.
+    # Returns (weights, K, loss per iteration); the last loss is that of the returned weights
+    targets = targets.astype(np.float32)
+    w0 = w0.astype(np.float32)
+    k = fit_scale(evaluate(F, w0), targets)
+    w = w0.copy()
+    m = np.zeros_like(w)
+    v = np.zeros_like(w)
+    losses = []
+    for t in range(1, iterations + 1):
+        loss, grad = loss_and_gradient(F, w, targets, k)
+        losses.append(loss)
+        if len(losses) > patience and losses[-patience - 1] - losses[-1] < tol * patience:
+            break
+        grad += l2 * (w - w0)
+        m = 0.9 * m + 0.1 * grad
+        v = 0.999 * v + 0.001 * grad * grad
+        w -= lr * (m / (1 - 0.9 ** t)) / (np.sqrt(v / (1 - 0.999 ** t)) + 1e-8)
+    else:
+        losses.append(loss_and_gradient(F, w, targets, k)[0])
+    return w, k, losses
+
+def split_params(w, F):
+    # Piece value = occurrence-weighted mean weight of that piece; the table holds the rest
+    W = w.reshape(6, 64)
+    counts = np.zeros(NUM_FEATURES, dtype=np.int64)
+    for start in range(0, len(F), CHUNK_ROWS):
+        counts += np.abs(F[start:start + CHUNK_ROWS]).sum(axis=0, dtype=np.int64)
+    counts = counts.reshape(6, 64)
+    values = {}
+    tables = {}
+    for piece_type in chess.PIECE_TYPES:
+        row = W[piece_type - 1]
+        seen = counts[piece_type - 1]
+        value = float(np.average(row, weights=seen)) if seen.sum() else float(row.mean())
+        if piece_type == chess.KING:
+            value = 0.0  # Both sides always have one, so the value is meaningless
+        symbol = chess.piece_symbol(piece_type).upper()
+        values[symbol] = round(value, 4)
+        tables[symbol] = [round(float(x), 4) for x in (row - value) / myengine.PST_SCALE]
+    return {'piece_values': values, 'piece_square_tables': tables}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tune classic evaluator piece values and PSTs on game results')
+    parser.add_argument('data', nargs='+', help='Self-play .npz files/shards and/or .pgn files')
+    parser.add_argument('-o', '--output', default=myengine.DEFAULT_PARAMS_PATH)
+    parser.add_argument('--iterations', type=int, default=200, help='Maximum Adam iterations')
+    parser.add_argument('--lr', type=float, default=0.05)
+    parser.add_argument('--l2', type=float, default=1e-4)
+    parser.add_argument('--skip-plies', type=int, default=8, help='Opening plies to skip in PGN games')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    F, targets = load_dataset(args.data, args.skip_plies)
+    print(f"Extracted {len(F)} positions x {F.shape[1]} features in {time.perf_counter() - start:.1f}s")
+    w0 = initial_weights(myengine.Evaluator(params_path=None))
+    start = time.perf_counter()
+    w, k, losses = tune(F, targets, w0, args.iterations, args.lr, args.l2)
+    print(f"Tuned in {time.perf_counter() - start:.1f}s ({len(losses) - 1} iterations): K={k:.2f}, "
+          f"loss {losses[0]:.4f} -> {losses[-1]:.4f}")
+    params = split_params(w, F)
+    with open(args.output, 'w') as f:
+        json.dump(params, f, indent=1)
+    print(f"Piece values: {params['piece_values']}")
+    print(f"Saved parameters to {args.output}")
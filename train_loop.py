@@ -0,0 +1,92 @@
+import argparse
+import glob
+import json
+import os
+import time
+
+import torch
+import torch.optim as optim
+import ml_model
+import train_ml
+
+SHARD_DIR = 'shards'
+MODELS_DIR = 'models'
+MODEL_PATH = 'ml_model.pth'
+STATE_PATH = os.path.join(MODELS_DIR, 'train_state.json')
+CHECKPOINT_PATH = os.path.join(MODELS_DIR, 'checkpoint.pt')
+LEARNING_RATE = 0.001
+
+def atomic_write(path, write):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        write(f)
+    os.replace(tmp, path)
+
+# Version counter and names of shards already trained on
+def load_state():
+    if os.path.exists(STATE_PATH):
+        with open(STATE_PATH) as f:
+            return json.load(f)
+    return {'version': 0, 'consumed': []}
+
+def save_state(state):
+    atomic_write(STATE_PATH, lambda f: f.write(json.dumps(state, indent=1).encode()))
+
+# Resume from the last checkpoint (weights and optimizer), else the live model, else scratch
+def load_checkpoint(model_path):
+    model = ml_model.BoardMLP()
+    optimizer = optim.Adam(model.parameters(), lr=LEARNING_RATE)
+    if os.path.exists(CHECKPOINT_PATH):
+        checkpoint = torch.load(CHECKPOINT_PATH, map_location=torch.device('cpu'))
+        model.load_state_dict(checkpoint['model'])
+        optimizer.load_state_dict(checkpoint['optimizer'])
+    elif os.path.exists(model_path):
+        model = ml_model.load_model(model_path)
+        optimizer = optim.Adam(model.parameters(), lr=LEARNING_RATE)
+    return model, optimizer
+
+def save_checkpoint(model, optimizer, version):
+    checkpoint = {'version': version, 'model': model.state_dict(), 'optimizer': optimizer.state_dict()}
+    atomic_write(CHECKPOINT_PATH, lambda f: torch.save(checkpoint, f))
+
+def run(args):
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    state = load_state()
+    consumed = set(state['consumed'])
+    model, optimizer = load_checkpoint(args.model)
+    print(f"Watching {args.shards}/ for new shards (current model v{state['version']})")
+    while True:
+        shards = sorted(glob.glob(os.path.join(args.shards, '*.npz')))
+        new = [path for path in shards if os.path.basename(path) not in consumed]
+        if len(new) < args.min_shards:
+            if args.once:
+                break
+            time.sleep(args.poll)
+            continue
+        # Mix in the most recent already-seen shards so the model doesn't forget them
+        seen = [path for path in shards if os.path.basename(path) in consumed]
+        replay = seen[-args.replay:] if args.replay else []
+        X, y = train_ml.load_data(new + replay)
+        print(f"Fine-tuning on {len(new)} new + {len(replay)} replay shards ({len(X)} positions)")
+        train_ml.fit(model, optimizer, X, y, epochs=args.epochs, batch_size=args.batch_size)
+        version = state['version'] + 1
+        save_checkpoint(model, optimizer, version)
+        path = ml_model.publish_model(model, version, args.model, MODELS_DIR)
+        consumed.update(os.path.basename(path) for path in new)
+        state = {'version': version, 'consumed': sorted(consumed)}
+        save_state(state)
+        print(f"Published v{version} to {args.model} ({path})")
+        if args.once:
+            break
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Continuously fine-tune the ML evaluator on new self-play shards')
+    parser.add_argument('--shards', default=SHARD_DIR, help='Directory selfplay.py --out writes shards into')
+    parser.add_argument('--model', default=MODEL_PATH, help='Live model file that engines hot-reload')
+    parser.add_argument('--min-shards', type=int, default=1, help='New shards needed before a training round')
+    parser.add_argument('--replay', type=int, default=4, help='Previously seen shards mixed into each round')
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=512)
+    parser.add_argument('--poll', type=float, default=10.0, help='Seconds between checks for new shards')
+    parser.add_argument('--once', action='store_true', help='Run at most one training round and exit')
+    run(parser.parse_args())
@@ -1,29 +1,54 @@
 import torch
 import torch.optim as optim
 import torch.nn as nn
+import os
 import ml_model
 import numpy as np
 
+DATA_PATH = 'selfplay_data.npz'
+
 # Dummy data: list of (board_tensor, score)
 def generate_dummy_data(num=1000):
     X = np.random.randn(num, 8*8*12).astype(np.float32)
     y = np.random.uniform(-10, 10, size=(num, 1)).astype(np.float32)
     return torch.tensor(X), torch.tensor(y)
 
-def train():
-    model = ml_model.BoardMLP()
-    optimizer = optim.Adam(model.parameters(), lr=0.001)
+# Self-play positions and results from one or more .npz files/shards
+def load_data(paths):
+    X = []
+    y = []
+    for path in paths:
+        with np.load(path) as data:
+            X.append(data['X'].astype(np.float32))
+            y.append(data['y'].astype(np.float32))
+    return torch.tensor(np.concatenate(X)), torch.tensor(np.concatenate(y))
+
+def fit(model, optimizer, X, y, epochs=10, batch_size=None):
     loss_fn = nn.MSELoss()
-    X, y = generate_dummy_data(2000)
-    epochs = 10
+    batch_size = batch_size or len(X)
     for epoch in range(epochs):
         model.train()
-        optimizer.zero_grad()
-        out = model(X)
-        loss = loss_fn(out, y)
-        loss.backward()
-        optimizer.step()
-        print(f"Epoch {epoch+1}/{epochs} Loss: {loss.item():.4f}")
+        perm = torch.randperm(len(X))
+        total = 0.0
+        for start in range(0, len(X), batch_size):
+            idx = perm[start:start + batch_size]
+            optimizer.zero_grad()
+            out = model(X[idx])
+            loss = loss_fn(out, y[idx])
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(idx)
+        print(f"Epoch {epoch+1}/{epochs} Loss: {total / len(X):.4f}")
+    model.eval()
+
+def train():
+    model = ml_model.BoardMLP()
+    optimizer = optim.Adam(model.parameters(), lr=0.001)
+    if os.path.exists(DATA_PATH):
+        X, y = load_data([DATA_PATH])
+    else:
+        X, y = generate_dummy_data(2000)
+    fit(model, optimizer, X, y, epochs=10)
     ml_model.save_model(model, 'ml_model.pth')
     print("Model saved to ml_model.pth")
 
@@ -0,0 +1,66 @@
+import chess
+import chess.polyglot
+
+# Incremental form of chess.polyglot.zobrist_hash: push() plays the move and returns
+# the key zobrist_hash(board) would give afterwards, without rehashing the board.
+# Keys are interchangeable with evalcache.position_key and polyglot opening books.
+_ARRAY = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+_hasher = chess.polyglot.ZobristHasher(_ARRAY)
+TURN_KEY = _ARRAY[780]
+
+def board_hash(board: chess.Board):
+    return _hasher(board)
+
+def piece_key(piece_type, color, square):
+    return _ARRAY[64 * ((piece_type - 1) * 2 + color) + square]
+
+_CASTLING_SQUARES = [(chess.BB_H1, 768), (chess.BB_A1, 769), (chess.BB_H8, 770), (chess.BB_A8, 771)]
+_castling_keys = {}
+
+def _castling_key(board):
+    rights = board.clean_castling_rights()
+    key = _castling_keys.get(rights)
+    if key is None:
+        key = 0
+        for mask, index in _CASTLING_SQUARES:
+            if rights & mask:
+                key ^= _ARRAY[index]
+        _castling_keys[rights] = key
+    return key
+
+def _state_key(board):
+    # Castling and en passant parts, skipped cheaply when there are none
+    key = 0
+    if board.castling_rights:
+        key ^= _castling_key(board)
+    if board.ep_square is not None:
+        key ^= _hasher.hash_ep_square(board)
+    return key
+
+def push(board: chess.Board, move: chess.Move, key):
+    key ^= _state_key(board) ^ TURN_KEY
+    if move:  # The null move only flips the side to move
+        color = board.turn
+        from_square = move.from_square
+        to_square = move.to_square
+        if board.is_castling(move):
+            rank = chess.square_rank(from_square)
+            if board.is_kingside_castling(move):
+                king_to, rook_from, rook_to = chess.square(6, rank), chess.square(7, rank), chess.square(5, rank)
+            else:
+                king_to, rook_from, rook_to = chess.square(2, rank), chess.square(0, rank), chess.square(3, rank)
+            key ^= piece_key(chess.KING, color, from_square) ^ piece_key(chess.KING, color, king_to)
+            key ^= piece_key(chess.ROOK, color, rook_from) ^ piece_key(chess.ROOK, color, rook_to)
+        else:
+            piece_type = board.piece_type_at(from_square)
+            if board.is_en_passant(move):
+                captured_square = to_square - 8 if color == chess.WHITE else to_square + 8
+                key ^= piece_key(chess.PAWN, not color, captured_square)
+            else:
+                captured = board.piece_type_at(to_square)
+                if captured:
+                    key ^= piece_key(captured, not color, to_square)
+            key ^= piece_key(piece_type, color, from_square)
+            key ^= piece_key(move.promotion or piece_type, color, to_square)
+    board.push(move)
+    return key ^ _state_key(board)